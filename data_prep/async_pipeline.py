@@ -0,0 +1,211 @@
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import psycopg
+from psycopg.rows import args_row
+from data_prep.checkpoint import CheckpointJournal
+from data_prep.writer import SentenceWriter
+from data_prep.parallel import resolve_workers
+from data_prep.metrics import PipelineMetrics
+from data_prep.parse_and_extract import (
+    make_document, TABLE_BLOCKS_QUERY, COUNT_QUERY, ROW_ESTIMATE_QUERY,
+    get_connection_info, ctid_range_queries, random_sample_query, tablesample_query,
+    sample_percent_for, make_partition, save_results, close_writer, page_cache_options, segment_store_options,
+    _init_worker, _process_worker_batch
+)
+
+# Marks the end of a stage's output
+_END = object()
+
+async def _fetch_value(conn, query):
+    """Return the single value produced by a query."""
+    cur = await conn.execute(query)
+    return (await cur.fetchone())[0]
+
+async def plan_queries(conn, mode='random', limit=2000, blocks_per_batch=1000,
+                       sample_percent=None, seed=0, sample_method='SYSTEM',
+                       shard_index=0, shard_count=1, partition_by='hash'):
+    """Return the (query, params) pairs to run for a fetch mode and shard, as in fetch_jsonl_strings."""
+    partition = make_partition(shard_index, shard_count, partition_by)
+    if mode == 'scan':
+        total_blocks = await _fetch_value(conn, TABLE_BLOCKS_QUERY)
+        logging.info(f"Scanning {total_blocks} blocks in ranges of {blocks_per_batch} blocks")
+        return [(query, params) for query, params, _ in
+                ctid_range_queries(total_blocks, blocks_per_batch, partition)]
+    if mode == 'sample':
+        if sample_percent is None:
+            estimate = await _fetch_value(conn, ROW_ESTIMATE_QUERY)
+            if estimate is None or estimate <= 0:
+                estimate = await _fetch_value(conn, COUNT_QUERY)
+            sample_percent = sample_percent_for(limit * shard_count, estimate)
+        logging.info(f"Sampling {sample_percent:.3f}% with {sample_method} (seed {seed}, limit {limit})")
+        return [tablesample_query(sample_percent, seed, sample_method, limit, partition)]
+    if mode == 'random':
+        return [random_sample_query(limit, partition)]
+    raise ValueError(f"Unknown fetch mode: {mode}")
+
+class AsyncExtractionPipeline:
+    """Fetch, process and write documents as concurrent asyncio stages.
+
+    The fetcher streams Documents from psycopg.AsyncConnection into a bounded
+    queue, the dispatcher groups them into batches and hands each batch to a
+    process pool, and the writer saves results and checkpoints in input order.
+    Bounded queues between the stages provide backpressure, and their depths
+    are logged periodically to show which stage is the bottleneck.
+    """
+
+    def __init__(self, output_file='sentences.txt', checkpoint_file='processed_ids.log',
+                 backend='senter', batch_size=64, workers=1, markdown_mode='fast',
+                 queue_size=1000, itersize=2000, report_interval=10.0, writer=None,
+                 cache_file=None, cache_size=200000, dedup=None, page_filter=None, quality_filter=None,
+                 chunk_size=50000, metrics=None, segment_file=None):
+        self.output_file = output_file
+        self.metrics = metrics or PipelineMetrics(report_interval)
+        self.writer = writer
+        self.dedup = dedup
+        self.page_filter = page_filter
+        self.checkpoint_file = checkpoint_file
+        self.backend = backend
+        self.batch_size = batch_size
+        self.workers = resolve_workers(workers)
+        self.options = {'batch_size': batch_size, 'markdown_mode': markdown_mode, 'quality_filter': quality_filter,
+                        'chunk_size': chunk_size}
+        self.cache_options = page_cache_options(cache_file, cache_size, backend, markdown_mode, quality_filter)
+        self.segment_options = segment_store_options(segment_file, backend, markdown_mode, chunk_size)
+        self.itersize = itersize
+        self.report_interval = report_interval
+        # Fetched documents waiting to be batched
+        self.documents = asyncio.Queue(queue_size)
+        # In-flight batches, in input order, waiting to be written
+        self.batches = asyncio.Queue(self.workers * 2)
+        self.counts = {'fetched': 0, 'dispatched': 0, 'written': 0}
+        self.max_depth = {'documents': 0, 'batches': 0}
+
+    async def fetch(self, **fetch_options):
+        """Stream Documents from PostgreSQL into the documents queue."""
+        try:
+            async with await psycopg.AsyncConnection.connect(get_connection_info()) as conn:
+                for query, params in await plan_queries(conn, **fetch_options):
+                    async with conn.cursor(name='fetch_documents', row_factory=args_row(make_document)) as cur:
+                        cur.itersize = self.itersize
+                        start = time.perf_counter()
+                        await cur.execute(query, params)
+                        async for document in cur:
+                            self.metrics.observe('fetch', time.perf_counter() - start)
+                            self.metrics.add('bytes_in', len(document.markdown.encode('utf-8')))
+                            await self.documents.put(document)
+                            self.counts['fetched'] += 1
+                            start = time.perf_counter()
+        finally:
+            await self.documents.put(_END)
+
+    async def dispatch(self, executor, processed_ids):
+        """Group unprocessed documents into batches and submit them to the executor."""
+        loop = asyncio.get_running_loop()
+        scheduled = set()
+        batch = []
+        while True:
+            document = await self.documents.get()
+            if document is not _END:
+                doc_id = document.custom_id
+                if doc_id in processed_ids or doc_id in scheduled:
+                    continue
+                if self.page_filter is not None and self.page_filter.skip_reason(document):
+                    continue
+                scheduled.add(doc_id)
+                batch.append(document)
+            if batch and (len(batch) >= self.batch_size or document is _END):
+                future = loop.run_in_executor(executor, _process_worker_batch, batch)
+                await self.batches.put(future)
+                self.counts['dispatched'] += len(batch)
+                batch = []
+            if document is _END:
+                await self.batches.put(_END)
+                return
+
+    async def write(self, writer, processed_ids):
+        """Save batch results in input order, off the event loop."""
+        while True:
+            future = await self.batches.get()
+            if future is _END:
+                return
+            results, worker_metrics = await future
+            self.metrics.merge(worker_metrics)
+            saving = asyncio.ensure_future(asyncio.to_thread(save_results, results, writer, processed_ids,
+                                                             self.dedup, self.metrics))
+            try:
+                await asyncio.shield(saving)
+            except asyncio.CancelledError:
+                # A running thread cannot be interrupted; let it finish before the writer is closed
+                await saving
+                raise
+            self.counts['written'] += len(results)
+
+    async def report(self):
+        """Periodically log queue depths and stage counters."""
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.log_depths()
+
+    def log_depths(self):
+        """Log the current depth of each queue and the per-stage document counts."""
+        depths = {'documents': self.documents.qsize(), 'batches': self.batches.qsize()}
+        for name, depth in depths.items():
+            self.max_depth[name] = max(self.max_depth[name], depth)
+        logging.info(f"Queue depth: documents {depths['documents']}/{self.documents.maxsize}, "
+                     f"batches {depths['batches']}/{self.batches.maxsize}; "
+                     f"fetched {self.counts['fetched']}, dispatched {self.counts['dispatched']}, "
+                     f"written {self.counts['written']}")
+
+    async def run(self, **fetch_options):
+        """Run all stages until the fetched stream has been written."""
+        writer = self.writer or SentenceWriter(self.output_file)
+
+        start = time.perf_counter()
+        with CheckpointJournal(self.checkpoint_file) as processed_ids, \
+                ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                    initargs=(self.backend, self.options, self.cache_options,
+                                              self.segment_options)) as executor:
+            stages = [
+                asyncio.create_task(self.fetch(**fetch_options)),
+                asyncio.create_task(self.dispatch(executor, processed_ids)),
+                asyncio.create_task(self.write(writer, processed_ids)),
+                asyncio.create_task(self.report())
+            ]
+            try:
+                done, _ = await asyncio.wait(stages[:3], return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    task.result()
+            finally:
+                # Stop every stage, and wait until none can touch the writer or journal, before closing them
+                for task in stages:
+                    task.cancel()
+                await asyncio.gather(*stages, return_exceptions=True)
+                close_writer(writer, processed_ids, self.metrics, self.dedup)
+                if self.dedup is not None:
+                    self.dedup.log_stats()
+                if self.page_filter is not None:
+                    self.page_filter.log_stats(time.perf_counter() - start)
+        self.log_depths()
+        logging.info(f"Metrics: {self.metrics.summary()}")
+        logging.info(f"Async pipeline finished in {time.perf_counter() - start:.1f}s; "
+                     f"max queue depth: documents {self.max_depth['documents']}, "
+                     f"batches {self.max_depth['batches']}")
+        return self.counts
+
+def run_async_pipeline(output_file='sentences.txt', checkpoint_file='processed_ids.log',
+                       backend='senter', batch_size=64, workers=1, markdown_mode='fast',
+                       queue_size=1000, itersize=2000, report_interval=10.0, writer=None,
+                       cache_file=None, cache_size=200000, dedup=None, page_filter=None, quality_filter=None,
+                       chunk_size=50000, metrics=None, segment_file=None, **fetch_options):
+    """Run the asyncio extraction pipeline; fetch_options are those of fetch_jsonl_strings."""
+    try:
+        pipeline = AsyncExtractionPipeline(output_file, checkpoint_file, backend, batch_size, workers,
+                                           markdown_mode, queue_size, itersize, report_interval, writer,
+                                           cache_file, cache_size, dedup, page_filter, quality_filter,
+                                           chunk_size, metrics, segment_file)
+        return asyncio.run(pipeline.run(**fetch_options))
+    except Exception as e:
+        logging.error(f"Error in async extraction pipeline: {e}")
+        raise
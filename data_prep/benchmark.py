@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime, timezone
+from data_prep.parse_and_extract import (
+    Document, convert_markdown, clean_texts, save_sentences, select_sentences, extract_sentences
+)
+from data_prep.segmentation import load_segmenter
+from data_prep.quality import SentenceQualityFilter
+from data_prep.checkpoint import CheckpointJournal
+from data_prep.page_filter import PageFilter
+from data_prep.writer import SentenceWriter
+
+# Vocabulary of the synthetic geology reports
+SUBJECTS = ['The property', 'The drill program', 'Historical sampling', 'The mineralized zone', 'The author',
+            'Surface mapping', 'The claim block', 'A soil geochemistry survey', 'The quartz vein', 'The company']
+VERBS = ['comprises', 'returned', 'intersected', 'was completed on', 'is located near', 'confirmed',
+         'extends along', 'was staked over', 'is hosted by', 'reported']
+OBJECTS = ['{n} mineral claims covering approximately {n} hectares', 'a {n} m wide shear zone',
+           'values up to {f} g/t Au over {f} m', 'the contact between mafic volcanics and granodiorite',
+           'NTS map sheet {n}M/{n}', 'the {w} Mining Division', 'a series of {n} diamond drill holes',
+           'anomalous copper and zinc values', 'the northwestern part of the {w} greenstone belt',
+           'an access trail built in {y}']
+PLACES = ['Thunder Bay', 'Atlin', 'Timmins', 'Red Lake', 'Kenora', 'Golden Eagle', 'Abitibi', 'Sudbury']
+HEADINGS = ['INTRODUCTION', 'PROPERTY DESCRIPTION AND LOCATION', 'GEOLOGICAL SETTING', 'EXPLORATION',
+            'DRILLING', 'SAMPLE PREPARATION', 'MINERAL RESOURCES', 'RECOMMENDATIONS', 'REFERENCES']
+# Typical OCR artifacts: LaTeX fragments, stray symbols, misread characters
+NOISE_FRAGMENTS = ['$59^{\\circ} 52^{\\prime}$', '$\\pm$', '~', '|', '$^{1}$', '•', '©', '...', '-']
+MISREADS = {'l': '1', 'O': '0', 'o': '0', 'S': '5', 'e': 'c', 'rn': 'm'}
+
+def _fill(template, rng):
+    """Fill the placeholders of a template with random numbers, places and years."""
+    return template.format(n=rng.randint(2, 999), f=round(rng.uniform(0.1, 40), 2),
+                           w=rng.choice(PLACES), y=rng.randint(1950, 2020))
+
+def synthetic_sentence(rng):
+    """Return one random report sentence."""
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {_fill(rng.choice(OBJECTS), rng)}."
+
+def synthetic_table(rng, rows):
+    """Return a pipe table of sample numbers and UTM coordinates, like the tables of sample_jsonl.json."""
+    lines = ['| Sample | Easting | Northing | Type |', '| :--: | :--: | :--: | :--: |']
+    for _ in range(rows):
+        lines.append(f"| {rng.randint(100000, 999999)} | {rng.randint(600000, 620000)} | "
+                     f"{rng.randint(5190000, 5210000)} | {rng.choice(['Outcrop', 'Subcrop', 'Float'])} |")
+    return '\n'.join(lines)
+
+def add_ocr_noise(text, rng, rate):
+    """Insert OCR artifacts into roughly `rate` of the words of a text."""
+    words = text.split(' ')
+    for i, word in enumerate(words):
+        if rng.random() < rate:
+            if rng.random() < 0.5:
+                words[i] = f"{word} {rng.choice(NOISE_FRAGMENTS)}"
+            else:
+                for wrong, right in MISREADS.items():
+                    if wrong in word:
+                        words[i] = word.replace(wrong, right, 1)
+                        break
+    return ' '.join(words)
+
+def synthetic_page(rng, prose=0.6, tables=0.25, headings=0.15, table_pages=0.1, noise=0.02, blocks=8):
+    """Return the markdown of one synthetic OCR page.
+
+    A `table_pages` fraction of pages are a single large table, as in
+    sample_jsonl.json; the others are `blocks` blocks drawn with the given
+    weights of prose paragraphs, pipe tables and headings, with OCR noise in
+    a `noise` fraction of their words.
+    """
+    if rng.random() < table_pages:
+        return synthetic_table(rng, rng.randint(30, 60))
+    parts = []
+    for _ in range(blocks):
+        kind = rng.choices(['prose', 'table', 'heading'], [prose, tables, headings])[0]
+        if kind == 'prose':
+            paragraph = ' '.join(synthetic_sentence(rng) for _ in range(rng.randint(2, 7)))
+            parts.append(add_ocr_noise(paragraph, rng, noise))
+        elif kind == 'table':
+            parts.append(synthetic_table(rng, rng.randint(3, 15)))
+        else:
+            parts.append(f"# {rng.randint(1, 20)}.0 {rng.choice(HEADINGS)}")
+    if rng.random() < 0.2:
+        parts.append("![img-0.jpeg](img-0.jpeg)")
+    return '\n\n'.join(parts)
+
+def generate_corpus(documents=500, seed=0, **mix):
+    """Return a reproducible list of synthetic Documents; `mix` is passed to synthetic_page."""
+    rng = random.Random(seed)
+    return [Document(f"(0,{i + 1})", f"BENCH{i // 200:05d}_P{i % 200}", i % 200, synthetic_page(rng, **mix))
+            for i in range(documents)]
+
+def corpus_records(corpus):
+    """Yield batch API records shaped like sample_jsonl.json for each Document."""
+    for document in corpus:
+        yield {
+            'id': f"batch-bench-{document.custom_id}",
+            'error': None,
+            'response': {
+                'status_code': 200,
+                'body': {
+                    'model': 'synthetic',
+                    'pages': [{'index': document.page_index, 'markdown': document.markdown,
+                               'images': [], 'dimensions': {'dpi': 200, 'width': 1700, 'height': 2200}}],
+                    'usage_info': {'pages_processed': 1, 'doc_size_bytes': len(document.markdown)}
+                }
+            },
+            'custom_id': document.custom_id
+        }
+
+def measure(func, documents, items=None, repeat=3, trace_memory=True):
+    """Time func() as the best of `repeat` runs and, in one more run, its peak traced memory.
+
+    Returns the timing record and the value returned by the last run.
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    record = {
+        'seconds': round(best, 6),
+        'documents': documents,
+        'docs_per_sec': round(documents / best, 2) if best else None
+    }
+    if items is not None:
+        record['items'] = items
+        record['items_per_sec'] = round(items / best, 2) if best else None
+    if trace_memory:
+        tracemalloc.start()
+        func()
+        record['peak_memory_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+        tracemalloc.stop()
+    return record, value
+
+def git_revision():
+    """Return the current git commit of the repository, or None outside a checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(documents=500, seed=0, backend='senter', repeat=3, workers=1, trace_memory=True, **mix):
+    """Benchmark each pipeline stage in isolation and end to end on a synthetic corpus."""
+    corpus = generate_corpus(documents, seed, **mix)
+    count = len(corpus)
+    stages = {}
+    logging.info(f"Benchmarking {count} synthetic documents ({sum(len(d.markdown) for d in corpus)} characters)")
+
+    for mode in ('full', 'fast'):
+        stages[f"markdown_{mode}"], texts = measure(
+            lambda: [convert_markdown(d.markdown, mode) for d in corpus], count, repeat=repeat,
+            trace_memory=trace_memory)
+    stages['clean_text'], cleaned = measure(lambda: clean_texts(texts), count, repeat=repeat,
+                                            trace_memory=trace_memory)
+
+    nlp = load_segmenter(backend)
+    segment = lambda: [select_sentences(doc) for doc in nlp.pipe(cleaned, batch_size=64)]
+    segmented = segment()
+    stages['segmentation'], _ = measure(segment, count, sum(map(len, segmented)), repeat, trace_memory)
+
+    quality_filter = SentenceQualityFilter()
+    # The first call builds the character lookup tables
+    quality_filter.filter_groups(segmented[:1])
+    stages['quality_filter'], filtered = measure(lambda: quality_filter.filter_groups(segmented), count,
+                                                 sum(map(len, segmented)), repeat, trace_memory)
+    sentence_count = sum(map(len, filtered))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        def run_save_sentences():
+            output_file = os.path.join(tmp_dir, 'save_sentences.txt')
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            for sentences in filtered:
+                save_sentences(sentences, output_file)
+
+        def run_writer():
+            output_file = os.path.join(tmp_dir, 'writer.txt')
+            for path in (output_file, f"{output_file}.journal"):
+                if os.path.exists(path):
+                    os.remove(path)
+            writer = SentenceWriter(output_file)
+            for document, sentences in zip(corpus, filtered):
+                writer.add(document.custom_id, sentences)
+            writer.close()
+
+        def run_checkpoint():
+            journal_file = os.path.join(tmp_dir, 'checkpoint.log')
+            if os.path.exists(journal_file):
+                os.remove(journal_file)
+            with CheckpointJournal(journal_file, legacy_file=None) as journal:
+                for document in corpus:
+                    journal.add(document.custom_id)
+
+        def run_end_to_end():
+            for name in ('end_to_end.txt', 'end_to_end.txt.journal', 'end_to_end.log'):
+                if os.path.exists(os.path.join(tmp_dir, name)):
+                    os.remove(os.path.join(tmp_dir, name))
+            extract_sentences(corpus, os.path.join(tmp_dir, 'end_to_end.txt'),
+                              os.path.join(tmp_dir, 'end_to_end.log'), backend=backend,
+                              workers=workers, page_filter=PageFilter(), legacy_file=None)
+
+        stages['save_sentences'], _ = measure(run_save_sentences, count, sentence_count, repeat, trace_memory)
+        stages['sentence_writer'], _ = measure(run_writer, count, sentence_count, repeat, trace_memory)
+        stages['checkpoint'], _ = measure(run_checkpoint, count, count, repeat, trace_memory)
+        # Logging per document would dominate the end-to-end time
+        logging.disable(logging.INFO)
+        try:
+            stages['end_to_end'], _ = measure(run_end_to_end, count, repeat=repeat, trace_memory=trace_memory)
+        finally:
+            logging.disable(logging.NOTSET)
+
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'documents': count, 'seed': seed, 'backend': backend, 'repeat': repeat,
+                   'workers': workers, 'mix': mix},
+        'stages': stages,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+def compare_results(results, baseline, tolerance=0.1):
+    """Return the stages whose docs/sec dropped more than `tolerance` below a baseline run."""
+    regressions = {}
+    for stage, record in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if previous and previous.get('docs_per_sec') and record.get('docs_per_sec'):
+            change = record['docs_per_sec'] / previous['docs_per_sec'] - 1
+            if change < -tolerance:
+                regressions[stage] = round(change, 3)
+    return regressions
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Benchmark the extraction stages on a synthetic OCR corpus.")
+    parser.add_argument('--documents', type=int, default=500, help="Number of synthetic pages")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the corpus generator")
+    parser.add_argument('--prose', type=float, default=0.6, help="Weight of prose paragraphs")
+    parser.add_argument('--tables', type=float, default=0.25, help="Weight of pipe tables")
+    parser.add_argument('--headings', type=float, default=0.15, help="Weight of headings")
+    parser.add_argument('--table-pages', type=float, default=0.1, help="Fraction of pages that are one large table")
+    parser.add_argument('--noise', type=float, default=0.02, help="Fraction of prose words with OCR noise")
+    parser.add_argument('--backend', choices=['sentencizer', 'senter', 'parser'], default='senter')
+    parser.add_argument('--workers', type=int, default=1, help="Extraction workers in the end-to-end run")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the best is reported")
+    parser.add_argument('--no-memory', dest='trace_memory', action='store_false',
+                        help="Skip the extra traced run that measures peak memory")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file the results are written to")
+    parser.add_argument('--baseline', default=None, help="Earlier results to compare docs/sec against")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Relative docs/sec drop against the baseline reported as a regression")
+    parser.add_argument('--write-corpus', default=None,
+                        help="Also write the synthetic corpus as JSON lines shaped like sample_jsonl.json")
+    args = parser.parse_args()
+
+    mix = {'prose': args.prose, 'tables': args.tables, 'headings': args.headings,
+           'table_pages': args.table_pages, 'noise': args.noise}
+    if args.write_corpus:
+        with open(args.write_corpus, 'w', encoding='utf-8') as f:
+            for record in corpus_records(generate_corpus(args.documents, args.seed, **mix)):
+                f.write(json.dumps(record) + '\n')
+
+    results = run_benchmarks(args.documents, args.seed, args.backend, args.repeat, args.workers,
+                             args.trace_memory, **mix)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    for stage, record in results['stages'].items():
+        logging.info(f"{stage}: {record['docs_per_sec']} docs/sec, peak {record.get('peak_memory_mb')} MB")
+    logging.info(f"Wrote benchmark results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.tolerance)
+        if regressions:
+            logging.error(f"Regressions against {args.baseline}: {regressions}")
+            sys.exit(1)
+        logging.info(f"No regressions against {args.baseline}")
\ No newline at end of file
@@ -0,0 +1,102 @@
+import os
+import re
+import json
+import logging
+from pathlib import Path
+
+# IDs of the JSON checkpoint before documents were keyed by custom_id
+CTID_PATTERN = re.compile(r'\(\d+,\d+\)')
+
+class CheckpointJournal:
+    """Append-only journal of processed document IDs.
+
+    Each processed ID is appended as one line, so recording a document costs
+    a single small write instead of rewriting the whole checkpoint. The full
+    set is loaded once at startup for fast membership checks, and IDs
+    already in it are not appended again, so the journal holds one line per
+    processed document.
+    """
+
+    def __init__(self, journal_file='processed_ids.log', legacy_file='processed_ids.json', fsync=False):
+        self.journal_file = Path(journal_file)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.fsync = fsync
+        self.ids = set()
+
+        if not self.journal_file.exists() and self.legacy_file and self.legacy_file.exists():
+            self.migrate_legacy()
+        self.load()
+        self.handle = open(self.journal_file, 'a', encoding='utf-8')
+
+    def migrate_legacy(self):
+        """One-shot migration of the JSON checkpoint file into the journal.
+
+        Entries that are ctids date from before documents were keyed by
+        custom_id and can never match a document again, so they are dropped.
+        """
+        with open(self.legacy_file, 'r') as f:
+            legacy_ids = json.load(f)
+        ctids = [doc_id for doc_id in legacy_ids if CTID_PATTERN.fullmatch(str(doc_id))]
+        if ctids:
+            logging.warning(f"{len(ctids)} of {len(legacy_ids)} IDs in {self.legacy_file} are ctids from before "
+                            f"documents were keyed by custom_id; the old checkpoint is obsolete and they are "
+                            f"not migrated")
+            legacy_ids = [doc_id for doc_id in legacy_ids if not CTID_PATTERN.fullmatch(str(doc_id))]
+        self._write_snapshot(legacy_ids)
+        logging.info(f"Migrated {len(legacy_ids)} processed IDs from {self.legacy_file} to {self.journal_file}")
+
+    def load(self):
+        """Load all journaled IDs, dropping a final line torn by a crash."""
+        self.ids = set()
+        if not self.journal_file.exists():
+            return
+        with open(self.journal_file, 'rb') as f:
+            data = f.read()
+        complete = data.rfind(b'\n') + 1
+        if complete < len(data):
+            logging.warning(f"Dropping incomplete last line in {self.journal_file}")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(complete)
+        for line in data[:complete].decode('utf-8').splitlines():
+            if line:
+                self.ids.add(line)
+        logging.info(f"Loaded {len(self.ids)} processed IDs from {self.journal_file}")
+
+    def _write_snapshot(self, ids):
+        """Atomically replace the journal with the given IDs."""
+        tmp_file = self.journal_file.with_name(self.journal_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for doc_id in ids:
+                f.write(f"{doc_id}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.journal_file)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, doc_id):
+        """Record a processed document ID."""
+        if doc_id in self.ids:
+            return
+        self.ids.add(doc_id)
+        self.handle.write(f"{doc_id}\n")
+        self.handle.flush()
+        if self.fsync:
+            os.fsync(self.handle.fileno())
+
+    def close(self):
+        """Flush and close the journal."""
+        if not self.handle.closed:
+            self.handle.flush()
+            os.fsync(self.handle.fileno())
+            self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
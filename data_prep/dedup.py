@@ -0,0 +1,194 @@
+import os
+import re
+import math
+import zlib
+import hashlib
+import logging
+import numpy as np
+
+# Modulus of the MinHash permutations (a Mersenne prime below 2**32)
+MINHASH_PRIME = (1 << 31) - 1
+WORD_PATTERN = re.compile(r'\w+')
+
+def sentence_digest(sentence):
+    """Return a 16 byte digest of a sentence, ignoring case and whitespace differences."""
+    normalized = ' '.join(sentence.casefold().split())
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16 byte digests.
+
+    The bit array is sized for `capacity` items at the given false positive
+    rate, so memory stays bounded however many items are added: 20 million
+    items at 0.1% take about 36 MB. Past capacity the false positive rate
+    grows, which here means unique sentences being dropped as duplicates.
+    """
+
+    def __init__(self, capacity=20000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, digests):
+        """Return the bit positions of each digest, by double hashing its two 64 bit halves."""
+        halves = np.frombuffer(b''.join(digests), dtype='<u8').reshape(-1, 2)
+        h1 = halves[:, 0]
+        h2 = halves[:, 1] | np.uint64(1)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + steps[None, :] * h2[:, None]) % np.uint64(self.num_bits)
+
+    def _present(self, positions):
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1)
+
+    def _set(self, positions):
+        positions = positions.ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         np.left_shift(np.uint8(1), (positions & np.uint64(7)).astype(np.uint8)))
+
+    def add_new(self, digests):
+        """Add distinct digests and return a boolean array marking those that were not already present."""
+        if not digests:
+            return np.zeros(0, dtype=bool)
+        positions = self._positions(digests)
+        new = ~self._present(positions)
+        self._set(positions[new])
+        self.count += int(new.sum())
+        if self.count > self.capacity and self.count - int(new.sum()) <= self.capacity:
+            logging.warning(f"Bloom filter exceeded its capacity of {self.capacity} items; "
+                            f"false positives will exceed {self.error_rate:.3%}")
+        return new
+
+    def contains_any(self, digests):
+        """Check whether any of the digests is present."""
+        return bool(digests) and bool(self._present(self._positions(digests)).any())
+
+class MinHashLSH:
+    """Detect near-duplicate sentences with MinHash signatures and LSH banding.
+
+    Each sentence is reduced to the set of its word `shingle_size`-grams and a
+    signature of `num_perm` MinHash values, split into `bands` bands. Two
+    sentences are candidates when any band matches, which happens with high
+    probability above a Jaccard similarity of about (1/bands)**(1/rows). Band
+    keys are kept in a Bloom filter instead of bucket lists, so memory stays
+    bounded (about `bands` times the exact filter) and matches are not verified
+    against the original sentence.
+    """
+
+    def __init__(self, num_perm=64, bands=16, shingle_size=3, capacity=20000000, error_rate=0.001, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MINHASH_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MINHASH_PRIME, num_perm, dtype=np.uint64)
+        self.seen = BloomFilter(capacity * bands, error_rate)
+
+    @property
+    def threshold(self):
+        """Approximate Jaccard similarity above which sentences are reported as near duplicates."""
+        return (1 / self.bands) ** (1 / self.rows)
+
+    def signature(self, sentence):
+        """Return the MinHash signature of a sentence's word shingles."""
+        words = WORD_PATTERN.findall(sentence.casefold())
+        size = min(self.shingle_size, len(words)) or 1
+        shingles = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        values = np.array([zlib.crc32(s.encode('utf-8')) % MINHASH_PRIME for s in shingles], dtype=np.uint64)
+        return ((self.a[:, None] * values[None, :] + self.b[:, None]) % np.uint64(MINHASH_PRIME)).min(axis=1)
+
+    def band_digests(self, signature):
+        """Return one digest per band of a signature."""
+        return [hashlib.blake2b(bytes([band]) + signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                                digest_size=16).digest()
+                for band in range(self.bands)]
+
+    def check_and_add(self, sentence):
+        """Check whether a similar sentence was seen before, and record this one."""
+        digests = self.band_digests(self.signature(sentence))
+        duplicate = self.seen.contains_any(digests)
+        self.seen.add_new(digests)
+        return duplicate
+
+class SentenceDeduplicator:
+    """Drop sentences already written earlier in the corpus.
+
+    Exact duplicates (ignoring case and whitespace) are detected with a Bloom
+    filter, and with `near_duplicates` also sentences similar to an earlier
+    one (see MinHashLSH). Runs in the main process between segmentation and
+    the writer, so the same sentence is dropped whichever worker produced it.
+
+    With a `state_file`, the filters are loaded on open and written by save(),
+    which should only be called once the sentences they have seen are
+    committed (close_writer() does so when a run ends, also after an error).
+    """
+
+    def __init__(self, capacity=20000000, error_rate=0.001, near_duplicates=False,
+                 num_perm=64, bands=16, shingle_size=3, state_file=None):
+        self.exact = BloomFilter(capacity, error_rate)
+        self.near = MinHashLSH(num_perm, bands, shingle_size, capacity, error_rate) if near_duplicates else None
+        self.state_file = state_file
+        self.counts = {'sentences': 0, 'exact_duplicates': 0, 'near_duplicates': 0}
+        if state_file and os.path.exists(state_file):
+            self.load()
+
+    def filter(self, sentences):
+        """Return the sentences not seen before, in order, and record them as seen."""
+        self.counts['sentences'] += len(sentences)
+        # Keep the first copy of sentences repeated within the document
+        unique = {}
+        for sentence in sentences:
+            unique.setdefault(sentence_digest(sentence), sentence)
+        new = self.exact.add_new(list(unique))
+        candidates = [sentence for sentence, is_new in zip(unique.values(), new) if is_new]
+        self.counts['exact_duplicates'] += len(sentences) - len(candidates)
+
+        if self.near is None:
+            return candidates
+        kept = [sentence for sentence in candidates if not self.near.check_and_add(sentence)]
+        self.counts['near_duplicates'] += len(candidates) - len(kept)
+        return kept
+
+    def log_stats(self):
+        """Log the number of sentences seen and dropped as duplicates."""
+        total = self.counts['sentences']
+        dropped = self.counts['exact_duplicates'] + self.counts['near_duplicates']
+        rate = dropped / total * 100 if total else 0.0
+        message = (f"Deduplication: {total} sentences, dropped {self.counts['exact_duplicates']} exact "
+                   f"duplicates")
+        if self.near is not None:
+            message += (f" and {self.counts['near_duplicates']} near duplicates "
+                        f"(Jaccard >~ {self.near.threshold:.2f})")
+        logging.info(f"{message} ({rate:.1f}% of sentences)")
+
+    def save(self):
+        """Write the filters to the state file."""
+        if not self.state_file:
+            return
+        arrays = {'exact': self.exact.bits, 'exact_count': self.exact.count}
+        if self.near is not None:
+            arrays.update({'near': self.near.seen.bits, 'near_count': self.near.seen.count})
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_file, self.state_file)
+        logging.info(f"Saved deduplication state to {self.state_file}")
+
+    def load(self):
+        """Load the filters from the state file; their sizes must match this deduplicator's settings."""
+        with np.load(self.state_file) as state:
+            filters = [('exact', self.exact)]
+            if self.near is not None:
+                filters.append(('near', self.near.seen))
+            for name, bloom in filters:
+                if name not in state or state[name].shape != bloom.bits.shape:
+                    raise ValueError(f"Deduplication state in {self.state_file} does not match the "
+                                     f"configured capacity and error rate")
+                bloom.bits = state[name].copy()
+                bloom.count = int(state[f"{name}_count"])
+        logging.info(f"Loaded deduplication state from {self.state_file} ({self.exact.count} sentences)")
\ No newline at end of file
@@ -0,0 +1,101 @@
+import io
+import gzip
+import json
+import logging
+import argparse
+from pathlib import Path
+from data_prep.writer import ShardedSentenceWriter, shard_documents, zstandard
+from data_prep.upload_to_minio import file_sha256
+
+def open_shard(path, compression):
+    """Open a sentence shard for reading text lines."""
+    if compression == 'gzip':
+        return gzip.open(path, 'rt', encoding='utf-8', newline='\n')
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ImportError("Reading zstd shards requires the 'zstandard' package")
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return io.TextIOWrapper(reader, encoding='utf-8', newline='\n')
+    return open(path, 'r', encoding='utf-8', newline='\n')
+
+def iter_shard_documents(shard_dir, entry, verify=True):
+    """Yield (doc_id, sentences) for each document of a shard listed in a manifest."""
+    path = Path(shard_dir) / entry['name']
+    if verify and file_sha256(path) != entry['sha256']:
+        raise ValueError(f"SHA-256 of {path} does not match its manifest")
+    with open_shard(path, entry['compression']) as f:
+        for doc_id, count in shard_documents(shard_dir, entry):
+            sentences = [f.readline().rstrip('\n') for _ in range(count)]
+            yield doc_id, sentences
+
+def load_input_manifest(input_dir):
+    """Return the manifest of a sharded text output, rejecting Parquet outputs."""
+    input_dir = Path(input_dir)
+    if not (input_dir / 'manifest.json').exists() and (input_dir / '_manifest.json').exists():
+        raise ValueError(f"{input_dir} holds Parquet output, which merge_shards does not support; "
+                         f"read the Parquet files as one dataset instead")
+    with open(input_dir / 'manifest.json', 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if any(entry.get('format', 'text') != 'text' for entry in manifest['shards']):
+        raise ValueError(f"{input_dir} lists shards that are not text; merge_shards only merges text shards")
+    return manifest
+
+def merge_shards(input_dirs, output_dir, prefix='sentences', compression='gzip',
+                 max_sentences=1000000, max_bytes=256 << 20, verify=True):
+    """Combine the sharded outputs of several runs into one corpus without duplicate documents.
+
+    Each input directory holds the shards and manifest.json written by a
+    ShardedSentenceWriter, typically one per --shard-index. Documents are
+    read in manifest order, and a document already taken from an earlier
+    input (or an earlier shard) is dropped, so overlapping runs merge
+    cleanly. Shards are verified against their manifest SHA-256 unless
+    `verify` is False. Returns counts of the documents and sentences kept and
+    dropped.
+
+    Parquet outputs (`--output-format parquet`, listed in `_manifest.json`)
+    are not supported and raise ValueError.
+    """
+    output_manifest = Path(output_dir) / 'manifest.json'
+    if output_manifest.exists():
+        raise ValueError(f"{output_manifest} already exists; merge into an empty directory")
+
+    counts = {'documents': 0, 'sentences': 0, 'duplicate_documents': 0, 'duplicate_sentences': 0}
+    seen = set()
+    writer = ShardedSentenceWriter(output_dir, prefix, compression, max_sentences, max_bytes)
+    try:
+        for input_dir in input_dirs:
+            manifest = load_input_manifest(input_dir)
+            logging.info(f"Merging {len(manifest['shards'])} shards from {input_dir}")
+            for entry in manifest['shards']:
+                for doc_id, sentences in iter_shard_documents(input_dir, entry, verify):
+                    if doc_id in seen:
+                        counts['duplicate_documents'] += 1
+                        counts['duplicate_sentences'] += len(sentences)
+                        continue
+                    seen.add(doc_id)
+                    writer.add(doc_id, sentences)
+                    counts['documents'] += 1
+                    counts['sentences'] += len(sentences)
+    finally:
+        writer.close()
+
+    logging.info(f"Merged {counts['documents']} documents ({counts['sentences']} sentences) into {output_dir}; "
+                 f"dropped {counts['duplicate_documents']} duplicate documents "
+                 f"({counts['duplicate_sentences']} sentences)")
+    return counts
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Merge sharded sentence outputs into one corpus without duplicates.")
+    parser.add_argument('output_dir', help="Empty directory for the merged shards and manifest")
+    parser.add_argument('input_dirs', nargs='+', help="Sharded output directories, one per shard run")
+    parser.add_argument('--prefix', default='sentences', help="File name prefix of the merged shards")
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip')
+    parser.add_argument('--shard-max-sentences', type=int, default=1000000)
+    parser.add_argument('--shard-max-bytes', type=int, default=256 << 20)
+    parser.add_argument('--no-verify', dest='verify', action='store_false',
+                        help="Skip checking input shards against their manifest SHA-256")
+    args = parser.parse_args()
+
+    merge_shards(args.input_dirs, args.output_dir, args.prefix, args.compression,
+                 args.shard_max_sentences, args.shard_max_bytes, args.verify)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import bisect
+import logging
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the stage timing histogram buckets
+HISTOGRAM_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 60.0)
+
+# Throughput and page cache counters kept by every PipelineMetrics
+COUNTERS = ('documents', 'sentences', 'bytes_in', 'bytes_out', 'page_cache_hits', 'page_cache_misses')
+
+class PipelineMetrics:
+    """Wall time per pipeline stage and throughput counters of one run.
+
+    Each stage keeps the number of observations, their total and maximum,
+    and a histogram over HISTOGRAM_BUCKETS. Stages timed and counters
+    increased in worker processes are sent back with each batch (see drain()
+    and merge()). A summary line is
+    logged at most every `log_interval` seconds, and the final figures can be
+    written as JSON or in the Prometheus text format.
+    """
+
+    def __init__(self, log_interval=60.0):
+        self.log_interval = log_interval
+        self.started = time.time()
+        self.last_log = time.monotonic()
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def observe(self, stage, seconds):
+        """Record one observation of a stage's wall time."""
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = {'count': 0, 'seconds': 0.0, 'max': 0.0,
+                                          'buckets': [0] * (len(HISTOGRAM_BUCKETS) + 1)}
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+        entry['buckets'][bisect.bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the body of a with block as one observation of a stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def add(self, counter, value=1):
+        """Increase a throughput counter."""
+        self.counters[counter] += value
+
+    def timed_iter(self, stage, iterable):
+        """Yield from an iterable, timing each wait for the next item as the given stage."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.observe(stage, time.perf_counter() - start)
+            yield item
+
+    def drain(self):
+        """Return the stage timings and counters recorded so far and reset them."""
+        drained = {'stages': self.stages, 'counters': self.counters}
+        self.stages = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        return drained
+
+    def merge(self, drained):
+        """Add stage timings and counters returned by drain() in another process."""
+        if not drained:
+            return
+        for counter, value in drained['counters'].items():
+            self.counters[counter] += value
+        for stage, other in drained['stages'].items():
+            entry = self.stages.get(stage)
+            if entry is None:
+                self.stages[stage] = other
+                continue
+            entry['count'] += other['count']
+            entry['seconds'] += other['seconds']
+            entry['max'] = max(entry['max'], other['max'])
+            entry['buckets'] = [a + b for a, b in zip(entry['buckets'], other['buckets'])]
+
+    def snapshot(self):
+        """Return all metrics as a JSON-serializable dict."""
+        elapsed = time.time() - self.started
+        return {
+            'started': self.started,
+            'elapsed_seconds': round(elapsed, 3),
+            'counters': dict(self.counters),
+            'documents_per_sec': round(self.counters['documents'] / elapsed, 2) if elapsed else None,
+            'sentences_per_sec': round(self.counters['sentences'] / elapsed, 2) if elapsed else None,
+            'histogram_buckets': list(HISTOGRAM_BUCKETS),
+            'stages': {stage: dict(entry, seconds=round(entry['seconds'], 6))
+                       for stage, entry in self.stages.items()}
+        }
+
+    def summary(self):
+        """Return a one-line summary of throughput and time per stage."""
+        snapshot = self.snapshot()
+        stages = ', '.join(f"{stage} {entry['seconds']:.2f}s" for stage, entry in
+                           sorted(snapshot['stages'].items(), key=lambda item: -item[1]['seconds']))
+        return (f"{self.counters['documents']} documents ({snapshot['documents_per_sec']}/s), "
+                f"{self.counters['sentences']} sentences ({snapshot['sentences_per_sec']}/s), "
+                f"{self.counters['bytes_in']} bytes in, {self.counters['bytes_out']} bytes out; "
+                f"{self.cache_summary()}stage time: {stages}")
+
+    def cache_summary(self):
+        """Return the page cache hit and miss totals for the summary, or '' without cache lookups."""
+        hits = self.counters['page_cache_hits']
+        lookups = hits + self.counters['page_cache_misses']
+        if not lookups:
+            return ''
+        return (f"page cache {hits} hits, {self.counters['page_cache_misses']} misses "
+                f"({hits / lookups * 100:.1f}% hit rate); ")
+
+    def maybe_log(self):
+        """Log the summary if the log interval has elapsed."""
+        now = time.monotonic()
+        if now - self.last_log >= self.log_interval:
+            self.last_log = now
+            logging.info(f"Metrics: {self.summary()}")
+
+    def prometheus_text(self, prefix='sentence_pipeline'):
+        """Return the metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [f"# HELP {prefix}_stage_seconds Wall time spent per pipeline stage.",
+                 f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, entry in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(HISTOGRAM_BUCKETS + ('+Inf',), entry['buckets']):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {entry["seconds"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {entry["count"]}')
+        for counter in COUNTERS:
+            lines.append(f"# TYPE {prefix}_{counter}_total counter")
+            lines.append(f"{prefix}_{counter}_total {self.counters[counter]}")
+        for gauge in ('documents_per_sec', 'sentences_per_sec', 'elapsed_seconds'):
+            lines.append(f"# TYPE {prefix}_{gauge} gauge")
+            lines.append(f"{prefix}_{gauge} {snapshot[gauge] or 0}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, metrics_file):
+        """Atomically write the metrics, in Prometheus format for .prom files and as JSON otherwise."""
+        if str(metrics_file).endswith('.prom'):
+            content = self.prometheus_text()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        tmp_file = f"{metrics_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_file, metrics_file)
+        logging.info(f"Wrote metrics to {metrics_file}")
\ No newline at end of file
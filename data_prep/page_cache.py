@@ -0,0 +1,113 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+
+class PageCache:
+    """Persistent cache of sentence lists keyed by a hash of the normalized page markdown.
+
+    Pages that are identical up to whitespace (repeated disclaimers,
+    boilerplate, blank table pages) are segmented once; later copies reuse the
+    stored sentence list, which may be empty when the page yielded nothing.
+    Entries are any JSON value; the pipeline stores the sentences together
+    with their character offsets.
+    The cache lives in SQLite, so worker processes can share one file, and is
+    bounded to `max_entries` pages with least-recently-used eviction.
+
+    `fingerprint` should identify the settings that produced the sentences
+    (segmentation backend, markdown mode, filters), so changing them never
+    returns stale results.
+    """
+
+    def __init__(self, cache_file='page_cache.sqlite', max_entries=200000, fingerprint='',
+                 log_every=10000):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.fingerprint = fingerprint
+        self.log_every = log_every
+        self.hits = 0
+        self.misses = 0
+        self.pending_touches = []
+        self.pending_inserts = []
+
+        self.conn = sqlite3.connect(cache_file, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                sentences TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)')
+        self.conn.commit()
+        self.size = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def key(self, markdown_string):
+        """Return the cache key of a page: a hash of the fingerprint and whitespace-normalized markdown."""
+        normalized = ' '.join(markdown_string.split())
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.fingerprint.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalized.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached entry for a key, or None on a miss."""
+        row = self.conn.execute('SELECT sentences FROM pages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self._maybe_log()
+            return None
+        self.hits += 1
+        self.pending_touches.append((time.time(), key))
+        self._maybe_log()
+        return json.loads(row[0])
+
+    def put(self, key, entry):
+        """Queue the entry of a page for storage at the next commit."""
+        self.pending_inserts.append((key, json.dumps(entry), time.time()))
+
+    def commit(self):
+        """Store queued entries and access times, then evict least recently used pages over the bound."""
+        if not self.pending_touches and not self.pending_inserts:
+            return
+        with self.conn:
+            self.conn.executemany('UPDATE pages SET last_used = ? WHERE key = ?', self.pending_touches)
+            before = self.conn.total_changes
+            self.conn.executemany('INSERT OR IGNORE INTO pages (key, sentences, last_used) VALUES (?, ?, ?)',
+                                  self.pending_inserts)
+            self.size += self.conn.total_changes - before
+            if self.size > self.max_entries:
+                self.size = self.conn.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+                excess = self.size - self.max_entries
+                if excess > 0:
+                    self.conn.execute("""
+                        DELETE FROM pages WHERE key IN (
+                            SELECT key FROM pages ORDER BY last_used LIMIT ?
+                        )
+                    """, (excess,))
+                    self.size -= excess
+                    logging.info(f"Evicted {excess} least recently used pages from {self.cache_file}")
+        self.pending_touches = []
+        self.pending_inserts = []
+
+    def _maybe_log(self):
+        lookups = self.hits + self.misses
+        if self.log_every and lookups % self.log_every == 0:
+            self.log_stats()
+
+    def log_stats(self):
+        """Log hit and miss counters of this cache instance."""
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0.0
+        logging.info(f"Page cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                     f"{self.size} cached pages")
+
+    def close(self):
+        """Commit pending entries, log counters and close the database."""
+        self.commit()
+        self.log_stats()
+        self.conn.close()
@@ -0,0 +1,82 @@
+import re
+import time
+import logging
+from collections import Counter
+
+ALPHA_PATTERN = re.compile(r'[^\W\d_]')
+WORD_PATTERN = re.compile(r'[^\W\d_]{2,}')
+
+def page_features(markdown_string):
+    """Compute cheap features of a page's raw markdown.
+
+    Returns the fraction of non-empty lines that are pipe table rows, and the
+    fraction of letters among the non-whitespace characters and the number of
+    alphabetic words, both outside table rows (tables are removed before
+    segmentation, so only that text can end up in sentences).
+    """
+    lines = [line for line in markdown_string.splitlines() if line.strip()]
+    prose_lines = [line for line in lines if not line.lstrip().startswith('|')]
+    prose = '\n'.join(prose_lines)
+    characters = len(''.join(prose.split()))
+    return {
+        'table_line_ratio': 1 - len(prose_lines) / len(lines) if lines else 0.0,
+        'alpha_ratio': len(ALPHA_PATTERN.findall(prose)) / characters if characters else 0.0,
+        'words': len(WORD_PATTERN.findall(prose))
+    }
+
+class PageFilter:
+    """Skip pages that cannot yield sentences before any expensive stage runs.
+
+    Pages made almost entirely of pipe tables, coordinates or other numbers
+    are recognized from page_features() and dropped before markdown
+    conversion and segmentation. A page is only skipped as a table when the
+    text outside its tables is also too short to yield sentences, so a short
+    introduction above a long table is kept. Skipped pages are not checkpointed, so a
+    later run with other thresholds reconsiders them.
+    """
+
+    def __init__(self, min_words=8, min_alpha_ratio=0.3, max_table_ratio=0.95):
+        self.min_words = min_words
+        self.min_alpha_ratio = min_alpha_ratio
+        self.max_table_ratio = max_table_ratio
+        self.pages = 0
+        self.skipped = Counter()
+        self.seconds = 0.0
+
+    def skip_reason(self, document):
+        """Return why a document should be skipped, or None to process it."""
+        start = time.perf_counter()
+        features = page_features(document.markdown)
+        self.seconds += time.perf_counter() - start
+        self.pages += 1
+
+        reason = None
+        if features['table_line_ratio'] > self.max_table_ratio and features['words'] < self.min_words:
+            reason = 'table'
+        elif features['alpha_ratio'] < self.min_alpha_ratio:
+            reason = 'numeric'
+        elif features['words'] < self.min_words:
+            reason = 'short'
+        if reason:
+            self.skipped[reason] += 1
+            logging.debug(f"Skipping {reason} page {document.custom_id}: {features}")
+        return reason
+
+    def filter(self, documents):
+        """Yield the documents that pass the filter."""
+        for document in documents:
+            if self.skip_reason(document) is None:
+                yield document
+
+    def log_stats(self, elapsed):
+        """Log skipped pages and estimate the time saved, from the time `elapsed` spent on the kept pages."""
+        skipped = sum(self.skipped.values())
+        kept = self.pages - skipped
+        reasons = ', '.join(f"{count} {reason}" for reason, count in self.skipped.most_common())
+        message = f"Page filter skipped {skipped} of {self.pages} pages"
+        if reasons:
+            message += f" ({reasons})"
+        if kept and skipped:
+            saved = skipped * max(elapsed - self.seconds, 0.0) / kept
+            message += f"; estimated {saved:.1f}s saved for {self.seconds:.2f}s spent filtering"
+        logging.info(message)
\ No newline at end of file
@@ -0,0 +1,83 @@
+import os
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+
+# Marks the end of a prefetched stream
+_END = object()
+
+def resolve_workers(workers):
+    """Return the worker count to use, treating 0 or None as one per CPU core."""
+    if not workers:
+        return os.cpu_count() or 1
+    return workers
+
+def ordered_pool_map(func, tasks, workers, initializer=None, initargs=(), max_pending=None):
+    """Run func over tasks in a process pool and yield results in task order.
+
+    Each worker runs `initializer(*initargs)` once, so expensive state such as
+    a spaCy model is loaded once per process. At most `max_pending` tasks are
+    in flight at a time, which keeps memory bounded when `tasks` is a long
+    stream.
+    """
+    if max_pending is None:
+        max_pending = workers * 2
+
+    logging.info(f"Starting {workers} worker processes")
+    with multiprocessing.Pool(workers, initializer=initializer, initargs=initargs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+def prefetch_iter(iterable, maxsize=10000):
+    """Iterate over `iterable` in a background thread, reading up to `maxsize` items ahead.
+
+    The bounded queue gives backpressure: the producer blocks once it is
+    `maxsize` items ahead of the consumer. Exceptions raised by the producer
+    are re-raised in the consumer.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up when the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END)
+        except BaseException as e:
+            put(e)
+        finally:
+            # Release the source (e.g. its database connection) in this thread
+            if hasattr(iterable, 'close'):
+                iterable.close()
+
+    producer = threading.Thread(target=produce, name='prefetch', daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join()
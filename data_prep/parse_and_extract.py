@@ -1,15 +1,25 @@
 import os
-import json
 import psycopg
-import spacy
 from dotenv import load_dotenv
 import markdown
 from bs4 import BeautifulSoup
 import re
-from pathlib import Path
+import html
+import hashlib
 import logging
+import time
+from collections import namedtuple
+from psycopg.rows import args_row
 from minio import Minio
 from datetime import datetime
+from data_prep.checkpoint import CheckpointJournal
+from data_prep.writer import SentenceWriter
+from data_prep.page_cache import PageCache
+from data_prep.quality import SentenceQualityFilter
+from data_prep.metrics import PipelineMetrics
+from data_prep.segment_store import SegmentStore, Provenance, stripped_spans
+from data_prep.segmentation import load_segmenter, segment_long_text_spans
+from data_prep.parallel import ordered_pool_map, prefetch_iter, resolve_workers
 
 # Set up logging
 logging.basicConfig(
@@ -58,8 +68,83 @@ def upload_to_minio(file_path, bucket_name, object_name):
         logging.error(f"Error uploading to MinIO: {e}")
         return False
 
+# Patterns used by clean_text, compiled once. The URL character class is the
+# flattened equivalent of the original alternation, which matched the same
+# characters one alternative at a time.
+URL_PATTERN = re.compile(r'https?://[!$-_a-z]+')
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s.,!?;:()/-]')
+REPEATED_PUNCT_PATTERN = re.compile(r'([.,!?;:])\1+')
+KEPT_PUNCTUATION = '.,!?;:'
+
+class _SpecialCharTable(dict):
+    """str.translate table mapping special characters to a space, filled in lazily per code point."""
+
+    def __missing__(self, codepoint):
+        value = ' ' if SPECIAL_CHARS_PATTERN.match(chr(codepoint)) else codepoint
+        self[codepoint] = value
+        return value
+
+SPECIAL_CHARS_TABLE = _SpecialCharTable()
+
+def remove_emails(text):
+    """Remove email addresses from whitespace-collapsed text.
+
+    Addresses cannot contain spaces, so only the words around each '@' are
+    matched against the pattern instead of scanning the whole text.
+    """
+    parts = []
+    position = 0
+    at = text.find('@')
+    while at != -1:
+        start = text.rfind(' ', position, at) + 1
+        if start == 0:
+            start = position
+        end = text.find(' ', at)
+        if end == -1:
+            end = len(text)
+        parts.append(text[position:start])
+        parts.append(EMAIL_PATTERN.sub('', text[start:end]))
+        position = end
+        at = text.find('@', end)
+    parts.append(text[position:])
+    return ''.join(parts)
+
 def clean_text(text):
-    """Clean extracted text with balanced cleaning rules."""
+    """Clean extracted text with balanced cleaning rules.
+
+    Produces the same output as clean_text_legacy with fewer passes over the
+    text: literal checks skip the URL and email patterns when they cannot
+    match, special characters are replaced with str.translate, and spaces
+    before punctuation are removed after whitespace is collapsed.
+    """
+    # Collapse all whitespace, including newlines, to single spaces
+    text = ' '.join(text.split())
+    
+    # Remove URLs and email addresses
+    if 'http' in text:
+        text = URL_PATTERN.sub('', text)
+    if '@' in text:
+        text = remove_emails(text)
+    
+    # Remove special characters but keep more punctuation
+    text = text.translate(SPECIAL_CHARS_TABLE)
+    
+    # Remove multiple punctuation marks
+    text = REPEATED_PUNCT_PATTERN.sub(r'\1', text)
+    
+    # Collapse the spaces left by the steps above, then remove spaces before punctuation
+    text = ' '.join(text.split())
+    for mark in KEPT_PUNCTUATION:
+        text = text.replace(' ' + mark, mark)
+    return text
+
+def clean_texts(texts):
+    """Clean a list of page texts, returning the cleaned texts in the same order."""
+    return [clean_text(text) for text in texts]
+
+def clean_text_legacy(text):
+    """Reference implementation of clean_text, kept to check the compiled cleaner against."""
     # Remove multiple spaces
     text = ' '.join(text.split())
     
@@ -88,8 +173,8 @@ def clean_text(text):
 
 def markdown_to_text(markdown_string):
     """Convert markdown to plain text, excluding table content."""
-    # Convert markdown to HTML
-    html = markdown.markdown(markdown_string)
+    # Convert markdown to HTML (the tables extension renders pipe tables as <table>)
+    html = markdown.markdown(markdown_string, extensions=['tables'])
     # Parse HTML and extract text
     soup = BeautifulSoup(html, features='html.parser')
     
@@ -105,166 +190,744 @@ def markdown_to_text(markdown_string):
     text = soup.get_text()
     return text
 
-def get_processed_ids():
-    """Get set of already processed document IDs from checkpoint file."""
-    checkpoint_file = Path('processed_ids.json')
-    if checkpoint_file.exists():
-        with open(checkpoint_file, 'r') as f:
-            return set(json.load(f))
-    return set()
-
-def save_processed_id(doc_id):
-    """Save processed document ID to checkpoint file."""
-    checkpoint_file = Path('processed_ids.json')
-    processed_ids = get_processed_ids()
-    processed_ids.add(doc_id)
-    with open(checkpoint_file, 'w') as f:
-        json.dump(list(processed_ids), f)
-
-def verify_saved_sentences(sentences, output_file, start_position):
-    """Verify that sentences were correctly saved to file."""
-    try:
-        if not os.path.exists(output_file):
-            return False
-        
-        with open(output_file, 'r', encoding='utf-8') as f:
-            f.seek(start_position)
-            saved_content = f.read().strip()
-            expected_content = '\n'.join(sentences)
-            return saved_content.endswith(expected_content)
-    except Exception as e:
-        logging.error(f"Error verifying saved sentences: {e}")
-        return False
+# Line-level markdown patterns, applied to the whole page in MULTILINE mode
+MD_TABLE_LINE = re.compile(r'^[ \t]*\|.*(?:\n|$)', re.M)
+MD_RULE_LINE = re.compile(r'^[ \t]*([-*_=])(?:[ \t]*\1){2,}[ \t]*$', re.M)
+MD_FENCE_LINE = re.compile(r'^[ \t]*(?:```|~~~).*$', re.M)
+MD_LINE_PREFIX = re.compile(r'^[ \t]*(?:>[ \t]?)*[ \t]*(?:#{1,6}[ \t]+|[-*+][ \t]+|\d+[.)][ \t]+)?', re.M)
+MD_HEADING_SUFFIX = re.compile(r'[ \t]+#+[ \t]*$', re.M)
+
+# Inline markdown patterns
+MD_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+MD_LINK = re.compile(r'\[([^\]]*)\]\([^)]*\)')
+MD_CODE = re.compile(r'`([^`]*)`')
+MD_STRONG_EM = re.compile(r'(\*{1,3})(\S(?:.*?\S)?)\1')
+MD_UNDERSCORE_EM = re.compile(r'(?<!\w)(_{1,3})(\S(?:.*?\S)?)\1(?!\w)')
+MD_HTML_TAG = re.compile(r'<[^>\n]+>')
+MD_ESCAPE = re.compile(r'\\([\\`*_{}\[\]()#+\-.!])')
+
+def strip_markdown(markdown_string):
+    """Convert markdown to plain text without rendering it, dropping pipe tables.
+
+    A line-oriented alternative to markdown_to_text: table rows, rules and code
+    fences are dropped, heading, list and quote markers are stripped, and
+    emphasis, links, images, inline code and HTML tags are reduced to their text.
+    """
+    text = MD_TABLE_LINE.sub('', markdown_string)
+    text = MD_RULE_LINE.sub('', text)
+    text = MD_FENCE_LINE.sub('', text)
+    text = MD_LINE_PREFIX.sub('', text)
+    text = MD_HEADING_SUFFIX.sub('', text)
+    
+    text = MD_IMAGE.sub('', text)
+    text = MD_LINK.sub(r'\1', text)
+    text = MD_CODE.sub(r'\1', text)
+    text = MD_STRONG_EM.sub(r'\2', text)
+    text = MD_UNDERSCORE_EM.sub(r'\2', text)
+    if '<' in text:
+        text = MD_HTML_TAG.sub('', text)
+    if '\\' in text:
+        text = MD_ESCAPE.sub(r'\1', text)
+    if '&' in text:
+        text = html.unescape(text)
+    return text
+
+MARKDOWN_MODES = ('fast', 'full', 'verify')
+
+def convert_markdown(markdown_string, mode='fast'):
+    """Convert markdown to plain text with the fast stripper or the full renderer.
+
+    mode='verify' runs both, logs a warning when their cleaned output differs,
+    and returns the result of the full renderer.
+    """
+    if mode == 'fast':
+        return strip_markdown(markdown_string)
+    if mode == 'full':
+        return markdown_to_text(markdown_string)
+    if mode == 'verify':
+        full_text = markdown_to_text(markdown_string)
+        fast_text = strip_markdown(markdown_string)
+        if clean_text(full_text) != clean_text(fast_text):
+            logging.warning(f"Fast markdown conversion differs from full rendering: "
+                            f"{clean_text(fast_text)[:200]!r} != {clean_text(full_text)[:200]!r}")
+        return full_text
+    raise ValueError(f"Unknown markdown mode: {mode}")
 
 def save_sentences(sentences, output_file):
-    """Save sentences to file with verification."""
+    """Append the sentences of one document to a file."""
     if not sentences:
         return True
-        
-    max_retries = 3
+    
     try:
-        # Get current file size for verification
-        start_position = os.path.getsize(output_file) if os.path.exists(output_file) else 0
-    except Exception:
-        start_position = 0
+        with open(output_file, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(sentences) + '\n')
+        return True
+    except Exception as e:
+        logging.error(f"Error saving sentences: {e}")
+        return False
+
+TABLE_NAME = '"43101pagesjsonl"'
+
+# A single OCR page fetched from the source table. `custom_id` is the stable
+# document key; `ctid` records where the row was read from.
+Document = namedtuple('Document', ['ctid', 'custom_id', 'page_index', 'markdown'])
+
+# Page number suffix of a custom_id, e.g. A001380_P165
+PAGE_SUFFIX = re.compile(r'_P(\d+)$')
+
+def page_number(custom_id, page_index=None):
+    """Return the page number of a custom_id's _P<n> suffix, or `page_index` if it has none.
+
+    Every row is a one-page OCR request, so the index of the page in the
+    response is always 0; the page number of the report is in the custom_id.
+    """
+    match = PAGE_SUFFIX.search(custom_id or '')
+    return int(match.group(1)) if match else page_index
+
+def make_document(ctid, custom_id, page_index, markdown):
+    """Return a Document whose page_index is the page number of its custom_id."""
+    return Document(ctid, custom_id, page_number(custom_id, page_index), markdown)
+
+# Columns of a Document, extracted from jsonl_cont by the server
+DOCUMENT_COLUMNS = """
+    ctid::text,
+    jsonl_cont->>'custom_id',
+    (jsonl_cont->'response'->'body'->'pages'->0->>'index')::int,
+    jsonl_cont->'response'->'body'->'pages'->0->>'markdown'
+"""
+
+# Only successful OCR responses that contain page markdown
+DOCUMENT_FILTER = """
+    jsonl_cont->>'error' IS NULL
+    AND (jsonl_cont->'response'->>'status_code')::int = 200
+    AND jsonl_cont->'response'->'body'->'pages'->0->>'markdown' IS NOT NULL
+"""
+
+# Part of the source rows one node processes: rows whose custom_id hashes to
+# `index` modulo `count`, or every `count`-th ctid block range of a scan
+Partition = namedtuple('Partition', ['index', 'count', 'method'])
+
+PARTITION_METHODS = ('hash', 'ctid')
+
+# The first 32 bits of md5(custom_id), as an unsigned integer, modulo the partition count
+PARTITION_HASH_FILTER = "mod(('x' || substr(md5(jsonl_cont->>'custom_id'), 1, 8))::bit(32)::bigint, %s) = %s"
+
+def make_partition(shard_index=0, shard_count=1, method='hash'):
+    """Return the Partition for a shard, or None when the rows are not partitioned."""
+    if method not in PARTITION_METHODS:
+        raise ValueError(f"Unknown partition method: {method}")
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+    if shard_count == 1:
+        return None
+    return Partition(shard_index, shard_count, method)
+
+def partition_of(custom_id, shard_count):
+    """Return the hash partition of a custom_id, as computed by the server."""
+    return int(hashlib.md5(custom_id.encode('utf-8')).hexdigest()[:8], 16) % shard_count
+
+def partition_clause(partition, scan=False):
+    """Return (sql, params) that restrict a query's WHERE clause to a hash partition."""
+    if partition is None or partition.method == 'ctid':
+        if partition is not None and not scan:
+            raise ValueError("ctid partitioning is only supported in scan mode")
+        return '', []
+    return f" AND {PARTITION_HASH_FILTER}", [partition.count, partition.index]
+
+def get_connection_info():
+    """Build the PostgreSQL connection string from environment variables."""
+    load_dotenv()
+    return f"host={os.getenv('PG_HOST')} port={os.getenv('PG_PORT')} dbname={os.getenv('PG_DB')} user={os.getenv('PG_USER')} password={os.getenv('PG_PASSWORD')}"
+
+# Metadata queries about the source table
+TABLE_BLOCKS_QUERY = f"SELECT pg_relation_size('{TABLE_NAME}') / current_setting('block_size')::int"
+COUNT_QUERY = f'SELECT COUNT(*) FROM {TABLE_NAME}'
+ROW_ESTIMATE_QUERY = f"SELECT reltuples::bigint FROM pg_class WHERE oid = '{TABLE_NAME}'::regclass"
+
+def get_table_blocks(conn):
+    """Return the number of heap blocks currently allocated to the source table."""
+    return conn.execute(TABLE_BLOCKS_QUERY).fetchone()[0]
+
+def count_documents(conn):
+    """Return the exact number of rows in the source table."""
+    return conn.execute(COUNT_QUERY).fetchone()[0]
+
+def estimate_row_count(conn):
+    """Return the planner's row estimate for the source table, counting rows if it has never been analyzed."""
+    estimate = conn.execute(ROW_ESTIMATE_QUERY).fetchone()[0]
+    if estimate is None or estimate <= 0:
+        estimate = count_documents(conn)
+    return estimate
+
+def ctid_range_queries(total_blocks, blocks_per_batch=1000, partition=None):
+    """Yield (query, params, end_block) for each ctid block range of a full-table scan.
+
+    Each query reads a contiguous range of heap blocks with a TID range scan,
+    so the total cost grows linearly with the table size and no sort is needed.
+    With a ctid Partition only every `count`-th range is read; with a hash
+    Partition every range is read and filtered by custom_id.
+    """
+    clause, partition_params = partition_clause(partition, scan=True)
+    for number, start_block in enumerate(range(0, total_blocks, blocks_per_batch)):
+        end_block = start_block + blocks_per_batch
+        if partition is not None and partition.method == 'ctid' and number % partition.count != partition.index:
+            continue
+        # The last range is left open so rows in blocks added during the scan are not lost
+        if end_block >= total_blocks:
+            yield f"""
+                SELECT {DOCUMENT_COLUMNS}
+                FROM {TABLE_NAME}
+                WHERE ctid >= %s::tid AND {DOCUMENT_FILTER}{clause}
+            """, (f"({start_block},0)", *partition_params), total_blocks
+        else:
+            yield f"""
+                SELECT {DOCUMENT_COLUMNS}
+                FROM {TABLE_NAME}
+                WHERE ctid >= %s::tid AND ctid < %s::tid AND {DOCUMENT_FILTER}{clause}
+            """, (f"({start_block},0)", f"({end_block},0)", *partition_params), end_block
+
+def random_sample_query(limit=2000, partition=None):
+    """Return (query, params) selecting `limit` random documents with a single sort."""
+    clause, partition_params = partition_clause(partition)
+    return f"""
+        SELECT {DOCUMENT_COLUMNS}
+        FROM {TABLE_NAME}
+        WHERE {DOCUMENT_FILTER}{clause}
+        ORDER BY RANDOM()
+        LIMIT %s
+    """, (*partition_params, limit)
+
+SAMPLE_METHODS = ('SYSTEM', 'BERNOULLI')
+
+def tablesample_query(percent, seed=0, method='SYSTEM', limit=None, partition=None):
+    """Return (query, params) for a seeded TABLESAMPLE ... REPEATABLE sample.
+
+    All shards draw the same sample, and a hash Partition keeps this shard's
+    share of it. A sample scan returns rows in heap order, so with a `limit`
+    the sampled rows are first ordered by a hash of custom_id and the seed;
+    otherwise the limit would keep only the rows of the first sampled blocks.
+    """
+    method = method.upper()
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unknown sampling method: {method}")
     
-    for attempt in range(max_retries):
-        try:
-            # Append sentences to file
-            with open(output_file, 'a', encoding='utf-8') as f:
-                f.write('\n'.join(sentences) + '\n')
-            
-            if verify_saved_sentences(sentences, output_file, start_position):
-                return True
-            else:
-                logging.warning(f"Save verification failed on attempt {attempt + 1}")
-        except Exception as e:
-            logging.error(f"Error saving sentences (attempt {attempt + 1}): {e}")
+    clause, partition_params = partition_clause(partition)
+    query = f"""
+        SELECT {DOCUMENT_COLUMNS}
+        FROM {TABLE_NAME} TABLESAMPLE {method} (%s) REPEATABLE (%s)
+        WHERE {DOCUMENT_FILTER}{clause}
+    """
+    params = [percent, seed, *partition_params]
+    if limit is not None:
+        query += " ORDER BY md5((jsonl_cont->>'custom_id') || %s) LIMIT %s"
+        params.extend([str(seed), limit])
+    return query, params
+
+def sample_percent_for(limit, total_docs):
+    """Return the TABLESAMPLE percentage expected to yield `limit` rows, with headroom for block sampling."""
+    return min(100.0, limit / max(total_docs, 1) * 100 * 1.2)
+
+def stream_query(conn, query, params, itersize=2000):
+    """Stream the rows of a query as Documents through a server-side cursor.
+
+    The named cursor fetches `itersize` rows per round trip, so the client
+    never buffers the whole result set.
+    """
+    with conn.cursor(name='fetch_documents', row_factory=args_row(make_document)) as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
+
+def scan_ctid_ranges(conn, blocks_per_batch=1000, itersize=2000, partition=None):
+    """Stream every row of the source table (or of a Partition) exactly once by walking ctid block ranges."""
+    total_blocks = get_table_blocks(conn)
+    logging.info(f"Scanning {total_blocks} blocks in ranges of {blocks_per_batch} blocks")
+    
+    rows_read = 0
+    for query, params, end_block in ctid_range_queries(total_blocks, blocks_per_batch, partition):
+        for row in stream_query(conn, query, params, itersize):
+            rows_read += 1
+            yield row
+        logging.info(f"Scanned blocks up to {end_block} of {total_blocks} ({rows_read} documents so far)")
+
+def sample_random(conn, limit=2000, batch_size=100, itersize=2000, partition=None):
+    """Stream a random sample of documents using a single sorted query."""
+    total_docs = count_documents(conn)
+    logging.info(f"Randomly selecting {limit} documents from {total_docs} total documents")
+    
+    # One sort for the whole sample, streamed in order, so rows never overlap
+    query, params = random_sample_query(limit, partition)
+    fetched = 0
+    for row in stream_query(conn, query, params, itersize):
+        yield row
+        fetched += 1
+        if fetched % batch_size == 0 or fetched == limit:
+            logging.info(f"Processed {fetched} out of {limit} randomly selected documents ({(fetched/limit*100):.1f}%)")
+
+def sample_repeatable(conn, limit=2000, percent=None, seed=0, method='SYSTEM', itersize=2000, partition=None):
+    """Stream a seeded sample of documents using TABLESAMPLE ... REPEATABLE.
+
+    When `percent` is not given it is derived from `limit` and the table's row
+    estimate, scaled by the partition count so each shard gets about `limit`
+    documents. The same seed returns the same documents as long as the table
+    is unchanged.
+    """
+    if percent is None:
+        shards = partition.count if partition else 1
+        percent = sample_percent_for(limit * shards, estimate_row_count(conn))
+    logging.info(f"Sampling {percent:.3f}% of {TABLE_NAME} with {method} (seed {seed}, limit {limit})")
     
-    return False
+    query, params = tablesample_query(percent, seed, method, limit, partition)
+    fetched = 0
+    for row in stream_query(conn, query, params, itersize):
+        fetched += 1
+        yield row
+    logging.info(f"Sampled {fetched} documents")
 
-def fetch_jsonl_strings():
-    """Fetch JSONL strings from PostgreSQL database."""
+def stream_documents(mode='random', limit=2000, batch_size=100, blocks_per_batch=1000,
+                     sample_percent=None, seed=0, sample_method='SYSTEM', itersize=2000, partition=None):
+    """Connect to PostgreSQL and stream Documents for the given fetch mode and Partition."""
     try:
-        # Load environment variables
-        load_dotenv()
-        
-        # Construct connection string
-        conn_info = f"host={os.getenv('PG_HOST')} port={os.getenv('PG_PORT')} dbname={os.getenv('PG_DB')} user={os.getenv('PG_USER')} password={os.getenv('PG_PASSWORD')}"
+        conn_info = get_connection_info()
         
         logging.info("Connecting to PostgreSQL database...")
         
         with psycopg.connect(conn_info) as conn:
-            with conn.cursor() as cur:
-                # Get total number of documents
-                cur.execute('SELECT COUNT(*) FROM "43101pagesjsonl"')
-                total_docs = cur.fetchone()[0]
-                logging.info(f"Total documents available: {total_docs}")
-                
-                # Set limit to 2000 documents
-                limit = 2000
-                logging.info(f"Randomly selecting {limit} documents from {total_docs} total documents")
-                
-                # Process documents in batches
-                batch_size = 100
-                for offset in range(0, limit, batch_size):
-                    current_batch_size = min(batch_size, limit - offset)
-                    cur.execute("""
-                        SELECT ctid::text, jsonl_cont 
-                        FROM "43101pagesjsonl" 
-                        ORDER BY RANDOM()
-                        LIMIT %s OFFSET %s
-                    """, (current_batch_size, offset))
-                    
-                    yield from cur
-                    
-                    logging.info(f"Processed {min(offset + current_batch_size, limit)} out of {limit} randomly selected documents ({(min(offset + current_batch_size, limit)/limit*100):.1f}%)")
+            if mode == 'scan':
+                yield from scan_ctid_ranges(conn, blocks_per_batch, itersize, partition)
+            elif mode == 'sample':
+                yield from sample_repeatable(conn, limit, sample_percent, seed, sample_method, itersize, partition)
+            else:
+                yield from sample_random(conn, limit, batch_size, itersize, partition)
                 
     except Exception as e:
         logging.error(f"Error fetching JSONL strings: {e}")
         raise
 
-def extract_sentences(jsonl_data, output_file='sentences.txt'):
-    """Extract sentences from JSONL data and save them."""
+def fetch_jsonl_strings(mode='random', limit=2000, batch_size=100, blocks_per_batch=1000,
+                        sample_percent=None, seed=0, sample_method='SYSTEM', itersize=2000, prefetch=10000,
+                        shard_index=0, shard_count=1, partition_by='hash'):
+    """Fetch OCR pages from PostgreSQL database as Document rows.
+
+    The page markdown, custom_id and page index are extracted from jsonl_cont
+    by the server, and failed OCR responses are filtered out there.
+
+    mode='random' streams a random sample of `limit` documents, logging
+    progress every `batch_size` documents; mode='sample' streams a
+    repeatable TABLESAMPLE of `limit` documents (or `sample_percent` of the
+    table) for the given `seed`; mode='scan' streams the full table by ctid
+    block ranges of `blocks_per_batch` blocks.
+
+    With `shard_count` > 1 only shard `shard_index` of the rows is fetched,
+    so several nodes can split one extraction. partition_by='hash' assigns
+    rows by a hash of custom_id in any mode; partition_by='ctid' assigns
+    whole block ranges and needs mode='scan'. Partitions are disjoint and
+    deterministic.
+
+    Rows are read through a server-side cursor `itersize` rows at a time. With
+    `prefetch` > 0 a background thread reads ahead into a queue of at most
+    `prefetch` documents, so fetching overlaps with processing while memory
+    stays bounded.
+    """
+    if mode not in ('random', 'sample', 'scan'):
+        raise ValueError(f"Unknown fetch mode: {mode}")
+    partition = make_partition(shard_index, shard_count, partition_by)
+    partition_clause(partition, scan=mode == 'scan')
+    
+    documents = stream_documents(mode, limit, batch_size, blocks_per_batch,
+                                 sample_percent, seed, sample_method, itersize, partition)
+    if prefetch:
+        return prefetch_iter(documents, prefetch)
+    return documents
+
+def select_sentences(doc):
+    """Return the stripped, non-empty sentences of a spaCy doc."""
+    sentences = []
+    for sent in doc.sents:
+        text = sent.text.strip()
+        if text:
+            sentences.append(text)
+    return sentences
+
+def process_batch(nlp, documents, batch_size=64, markdown_mode='fast', cache=None, quality_filter=None,
+                  chunk_size=50000, metrics=None, segments=None):
+    """Convert, clean and segment a batch of Documents.
+
+    Returns (doc_id, sentences, provenance) tuples in input order, keyed by
+    custom_id, where provenance is a Provenance with the character offsets of
+    the kept sentences in the cleaned text. `sentences` and `provenance` are
+    None for documents that could not be processed: if processing the batch
+    fails, its documents are retried one at a time and only those that fail on
+    their own are skipped. Sentences of the whole batch are filtered in one
+    pass by `quality_filter` (a SentenceQualityFilter with default thresholds
+    if None). Texts longer than `chunk_size` characters are segmented chunk by
+    chunk (see segment_long_text_spans). With a PageCache, pages already seen
+    are answered from the cache and skip all processing. With a SegmentStore,
+    the cleaned text and unfiltered sentence offsets of each segmented page
+    are stored, and the page cache is not read so that every page gets its
+    offsets. The wall time of each stage of the batch, and page cache hits and
+    misses, are recorded in `metrics`, if given.
+    """
+    options = {'batch_size': batch_size, 'markdown_mode': markdown_mode, 'cache': cache,
+               'quality_filter': quality_filter, 'chunk_size': chunk_size, 'metrics': metrics, 'segments': segments}
     try:
-        # Initialize spaCy
-        logging.info("Loading spaCy model...")
-        nlp = spacy.load('en_core_web_sm')
+        return _process_documents(nlp, documents, **options)
+    except Exception as e:
+        logging.error(f"Error processing a batch of {len(documents)} documents, retrying one at a time: {e}")
+    results = []
+    for document in documents:
+        try:
+            results.extend(_process_documents(nlp, [document], **options))
+        except Exception as e:
+            logging.error(f"Error processing document {document.custom_id}: {e}")
+            results.append((document.custom_id, None, None))
+    return results
+
+def _process_documents(nlp, documents, batch_size=64, markdown_mode='fast', cache=None, quality_filter=None,
+                       chunk_size=50000, metrics=None, segments=None):
+    """Process Documents as in process_batch(), raising on any error outside a single page's conversion."""
+    quality_filter = quality_filter or SentenceQualityFilter()
+    metrics = metrics or PipelineMetrics()
+    results = []
+    plain_texts = []
+    indices = []
+    cache_keys = {}
+    cache_seconds = 0.0
+    markdown_seconds = 0.0
+    for document in documents:
+        doc_id = document.custom_id
+        try:
+            if cache is not None and segments is None:
+                start = time.perf_counter()
+                key = cache.key(document.markdown)
+                cached = cache.get(key)
+                cache_seconds += time.perf_counter() - start
+                metrics.add('page_cache_misses' if cached is None else 'page_cache_hits')
+                if cached is not None:
+                    sentences, spans = cached
+                    results.append((doc_id, sentences, Provenance(document.ctid, document.page_index,
+                                                                  [tuple(span) for span in spans])))
+                    continue
+                cache_keys[len(results)] = key
+            start = time.perf_counter()
+            plain_texts.append(convert_markdown(document.markdown, markdown_mode))
+            markdown_seconds += time.perf_counter() - start
+            indices.append(len(results))
+        except Exception as e:
+            logging.error(f"Error processing document {doc_id}: {e}")
+        results.append((doc_id, None, None))
+    metrics.observe('markdown', markdown_seconds)
+    
+    # Clean and segment all texts of the batch at once
+    with metrics.timer('clean'):
+        cleaned = clean_texts(plain_texts)
+    with metrics.timer('segment'):
+        chunk_size = min(chunk_size, nlp.max_length)
+        texts = []
+        segmented = []
+        for text, index in zip(cleaned, indices):
+            if len(text) > chunk_size:
+                # Oversized pages are segmented on their own, one bounded chunk at a time
+                logging.info(f"Segmenting {len(text)} characters of document {results[index][0]} in chunks")
+                segmented.append((index, text, segment_long_text_spans(nlp, text, chunk_size)))
+            else:
+                texts.append((text, index))
+        segmented.extend((index, doc.text, stripped_spans(doc))
+                         for doc, index in nlp.pipe(texts, as_tuples=True, batch_size=batch_size))
+        segmented.sort(key=lambda item: item[0])
+    
+    if segments is not None:
+        with metrics.timer('segment_store'):
+            for index, text, spans in segmented:
+                segments.put(documents[index], text, spans)
+            segments.commit()
+    
+    # Filter the sentences of all documents at once
+    with metrics.timer('quality_filter'):
+        masks = quality_filter.mask_groups([[text[start:end] for start, end in spans]
+                                            for _, text, spans in segmented])
+    for (index, text, spans), keep in zip(segmented, masks):
+        spans = [span for span, k in zip(spans, keep) if k]
+        sentences = [text[start:end] for start, end in spans]
+        document = documents[index]
+        results[index] = (document.custom_id, sentences, Provenance(document.ctid, document.page_index, spans))
+        if index in cache_keys:
+            cache.put(cache_keys[index], [sentences, spans])
+    
+    if cache is not None:
+        start = time.perf_counter()
+        cache.commit()
+        metrics.observe('page_cache', cache_seconds + time.perf_counter() - start)
+    return results
+
+def iter_batches(records, batch_size):
+    """Group an iterable of records into lists of at most batch_size records."""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Per-process state of extraction workers
+_worker_nlp = None
+_worker_options = None
+_worker_cache = None
+_worker_metrics = None
+_worker_segments = None
+
+def _init_worker(backend, options, cache_options=None, segment_options=None):
+    """Load the segmenter, and open the page cache and segment store if used, once in each worker process."""
+    global _worker_nlp, _worker_options, _worker_cache, _worker_metrics, _worker_segments
+    _worker_nlp = load_segmenter(backend)
+    _worker_options = options
+    _worker_metrics = PipelineMetrics()
+    if cache_options:
+        # Hits and misses are counted in _worker_metrics and logged as totals by the main process
+        _worker_cache = PageCache(log_every=0, **cache_options)
+    if segment_options:
+        _worker_segments = SegmentStore(**segment_options)
+
+def _process_worker_batch(documents):
+    """Process a batch of documents in a worker process and return its results, stage timings and counters."""
+    results = process_batch(_worker_nlp, documents, cache=_worker_cache, metrics=_worker_metrics,
+                            segments=_worker_segments, **_worker_options)
+    return results, _worker_metrics.drain()
+
+def page_cache_options(cache_file, cache_size, backend, markdown_mode, quality_filter=None):
+    """Return PageCache arguments for the given settings, or None when caching is disabled."""
+    if not cache_file:
+        return None
+    return {
+        'cache_file': cache_file,
+        'max_entries': cache_size,
+        'fingerprint': f"{backend}|{markdown_mode}|{quality_filter or SentenceQualityFilter()!r}|offsets"
+    }
+
+def segment_store_options(segment_file, backend, markdown_mode, chunk_size):
+    """Return SegmentStore arguments for the given settings, or None when offsets are not stored."""
+    if not segment_file:
+        return None
+    return {'segment_file': segment_file, 'fingerprint': f"{backend}|{markdown_mode}|{chunk_size}"}
+
+def filter_unprocessed(documents, processed_ids):
+    """Yield documents that are neither checkpointed nor already scheduled in this run."""
+    scheduled = set()
+    for document in documents:
+        doc_id = document.custom_id
+        # Skip if already processed
+        if doc_id in processed_ids:
+            logging.info(f"Skipping already processed document {doc_id}")
+            continue
+        # Skip duplicates of a document that is already in flight
+        if doc_id in scheduled:
+            logging.info(f"Skipping duplicate document {doc_id}")
+            continue
+        scheduled.add(doc_id)
+        yield document
+
+def measure_documents(documents, metrics):
+    """Yield documents, timing each wait for the next one as the 'fetch' stage and counting their bytes."""
+    for document in metrics.timed_iter('fetch', documents):
+        metrics.add('bytes_in', len(document.markdown.encode('utf-8')))
+        yield document
+
+def checkpoint(committed_ids, processed_ids, metrics):
+    """Add committed document IDs to the checkpoint journal, timing each write."""
+    for committed_id in committed_ids:
+        with metrics.timer('checkpoint'):
+            processed_ids.add(committed_id)
+
+def kept_provenance(provenance, sentences, kept):
+    """Return the Provenance of `kept`, an in-order subsequence of `sentences` such as dedup leaves."""
+    spans = []
+    position = 0
+    for sentence, span in zip(sentences, provenance.spans):
+        if position < len(kept) and sentence == kept[position]:
+            spans.append(span)
+            position += 1
+    return provenance._replace(spans=spans)
+
+def save_results(results, writer, processed_ids, dedup=None, metrics=None):
+    """Hand processed documents to the writer and checkpoint those it has committed.
+
+    `results` are (doc_id, sentences, provenance) tuples as returned by
+    process_batch. With a SentenceDeduplicator, sentences seen earlier in the
+    corpus are dropped before writing, along with their offsets. Writer and
+    checkpoint times and the documents, sentences and bytes written are
+    recorded in `metrics`, if given.
+    """
+    metrics = metrics or PipelineMetrics()
+    for doc_id, sentences, provenance in results:
+        if sentences is None:
+            continue
         
-        # Get already processed document IDs
-        processed_ids = get_processed_ids()
+        if dedup is not None:
+            with metrics.timer('dedup'):
+                kept = dedup.filter(sentences)
+                provenance = kept_provenance(provenance, sentences, kept)
+                sentences = kept
+        if sentences:
+            logging.info(f"Successfully processed document {doc_id} with {len(sentences)} sentences")
+        else:
+            logging.warning(f"No valid sentences found in document {doc_id}")
+        with metrics.timer('write'):
+            committed_ids = writer.add(doc_id, sentences, provenance)
+        checkpoint(committed_ids, processed_ids, metrics)
+        metrics.add('documents')
+        metrics.add('sentences', len(sentences))
+        metrics.add('bytes_out', sum(len(sentence.encode('utf-8')) + 1 for sentence in sentences))
+    metrics.maybe_log()
+
+def close_writer(writer, processed_ids, metrics=None, dedup=None):
+    """Flush and close the writer, checkpointing the documents of its last batch.
+
+    Once everything the SentenceDeduplicator `dedup` has seen is committed
+    and checkpointed, its state is saved too, also when the run failed, so a
+    resumed run keeps dropping the sentences already written.
+    """
+    metrics = metrics or PipelineMetrics()
+    with metrics.timer('write'):
+        committed_ids = writer.close()
+    checkpoint(committed_ids, processed_ids, metrics)
+    if dedup is not None:
+        dedup.save()
+
+def extract_sentences(documents, output_file='sentences.txt', checkpoint_file='processed_ids.log',
+                      backend='senter', batch_size=64, workers=1, markdown_mode='fast', writer=None,
+                      cache_file=None, cache_size=200000, dedup=None, page_filter=None,
+                      quality_filter=None, chunk_size=50000, metrics=None, segment_file=None,
+                      legacy_file='processed_ids.json'):
+    """Extract sentences from Document rows and save them.
+
+    Markdown is converted with `markdown_mode` ('fast', 'full' or 'verify', see
+    convert_markdown). Documents are segmented with the given backend
+    ('sentencizer', 'senter' or 'parser') in nlp.pipe batches of `batch_size`
+    documents. With more than one worker, batches are processed by a pool of
+    worker processes while this process writes results and checkpoints in
+    input order.
+
+    Sentences are written by `writer` (a SentenceWriter on `output_file` by
+    default), and a document is checkpointed once the writer has committed it.
+    A new checkpoint journal starts from the IDs in the JSON checkpoint
+    `legacy_file`, if it exists (None skips the migration).
+
+    With a `cache_file`, sentence lists are cached by page content (see
+    PageCache) so duplicate pages are only processed once. With a `dedup`
+    SentenceDeduplicator, duplicate sentences are dropped before writing.
+    With a `page_filter` (see PageFilter), pages that cannot yield sentences
+    are skipped before conversion and segmentation. Sentences are kept if
+    they pass `quality_filter` (a SentenceQualityFilter, default thresholds
+    if None). Pages longer than `chunk_size` characters after cleaning are
+    segmented in chunks, which bounds the memory spaCy needs per document.
+    With a `segment_file`, the cleaned text and sentence offsets of each page
+    are kept in a SegmentStore for refilter_sentences().
+
+    Stage timings and throughput are collected in `metrics` (a new
+    PipelineMetrics if None), logged periodically and summarized at the end.
+    """
+    cache = None
+    segments = None
+    metrics = metrics or PipelineMetrics()
+    try:
+        options = {'batch_size': batch_size, 'markdown_mode': markdown_mode, 'quality_filter': quality_filter,
+                   'chunk_size': chunk_size}
+        cache_options = page_cache_options(cache_file, cache_size, backend, markdown_mode, quality_filter)
+        segment_options = segment_store_options(segment_file, backend, markdown_mode, chunk_size)
+        workers = resolve_workers(workers)
+        if workers == 1:
+            # Initialize spaCy with only the components segmentation needs
+            logging.info(f"Loading spaCy model for the '{backend}' backend...")
+            nlp = load_segmenter(backend)
+            if cache_options:
+                cache = PageCache(**cache_options)
+            if segment_options:
+                segments = SegmentStore(**segment_options)
         
-        # Create output file if it doesn't exist
-        if not os.path.exists(output_file):
-            open(output_file, 'w', encoding='utf-8').close()
+        if writer is None:
+            writer = SentenceWriter(output_file)
         
-        for doc_id, jsonl_content in jsonl_data:
-            # Skip if already processed
-            if doc_id in processed_ids:
-                logging.info(f"Skipping already processed document {doc_id}")
-                continue
+        # Open the checkpoint journal of already processed document IDs
+        with CheckpointJournal(checkpoint_file, legacy_file=legacy_file) as processed_ids:
+            documents = filter_unprocessed(measure_documents(documents, metrics), processed_ids)
+            if page_filter is not None:
+                documents = page_filter.filter(documents)
+            batches = iter_batches(documents, batch_size)
+            if workers == 1:
+                batch_results = ((process_batch(nlp, batch, cache=cache, metrics=metrics, segments=segments,
+                                                **options), None)
+                                 for batch in batches)
+            else:
+                batch_results = ordered_pool_map(_process_worker_batch, batches, workers,
+                                                 initializer=_init_worker,
+                                                 initargs=(backend, options, cache_options, segment_options))
             
+            start = time.perf_counter()
             try:
-                # Extract markdown content
-                markdown_content = jsonl_content['response']['body']['pages'][0]['markdown']
-                
-                # Convert markdown to plain text
-                plain_text = markdown_to_text(markdown_content)
-                plain_text = clean_text(plain_text)
-                
-                # Process with spaCy for sentence segmentation
-                doc = nlp(plain_text)
-                
-                # Extract and filter sentences
-                sentences = []
-                for sent in doc.sents:
-                    text = sent.text.strip()
-                    if 10 <= len(text) <= 500:
-                        sentences.append(text)
-                
-                # Save sentences if we found any
-                if sentences:
-                    if save_sentences(sentences, output_file):
-                        logging.info(f"Successfully processed and saved document {doc_id} with {len(sentences)} sentences")
-                        save_processed_id(doc_id)
-                    else:
-                        logging.error(f"Failed to save sentences for document {doc_id}")
-                else:
-                    logging.warning(f"No valid sentences found in document {doc_id}")
-                    save_processed_id(doc_id)
-                
-            except KeyError as e:
-                logging.error(f"Error accessing JSON structure in document {doc_id}: {e}")
-                continue
-            except Exception as e:
-                logging.error(f"Error processing document {doc_id}: {e}")
-                continue
+                for results, worker_metrics in batch_results:
+                    metrics.merge(worker_metrics)
+                    save_results(results, writer, processed_ids, dedup, metrics)
+            finally:
+                close_writer(writer, processed_ids, metrics, dedup)
+                if dedup is not None:
+                    dedup.log_stats()
+                if page_filter is not None:
+                    page_filter.log_stats(time.perf_counter() - start)
+                logging.info(f"Metrics: {metrics.summary()}")
                 
     except Exception as e:
         logging.error(f"Error in sentence extraction: {e}")
         raise
+    finally:
+        if cache is not None:
+            cache.close()
+        if segments is not None:
+            segments.close()
+
+def refilter_sentences(segment_file, output_file='sentences.txt', checkpoint_file='refilter_ids.log',
+                       writer=None, dedup=None, quality_filter=None, batch_size=256, metrics=None):
+    """Regenerate the sentence output from a SegmentStore without loading an NLP model.
+
+    Sentences are sliced from the stored cleaned texts at the stored offsets,
+    filtered with `quality_filter` (a SentenceQualityFilter, default
+    thresholds if None) `batch_size` documents at a time, and written and
+    checkpointed as in extract_sentences(). Use a checkpoint file separate
+    from the one of the extraction that filled the store.
+    """
+    quality_filter = quality_filter or SentenceQualityFilter()
+    metrics = metrics or PipelineMetrics()
+    segments = SegmentStore(segment_file)
+    try:
+        logging.info(f"Refiltering {segments.count()} documents from {segment_file} with {quality_filter!r}")
+        if writer is None:
+            writer = SentenceWriter(output_file)
+        # The legacy checkpoint lists documents of an extraction, not of a refilter
+        with CheckpointJournal(checkpoint_file, legacy_file=None) as processed_ids:
+            stored = metrics.timed_iter('segment_store', segments.iter_documents())
+            stored = (result for result in stored if result[0] not in processed_ids)
+            try:
+                for batch in iter_batches(stored, batch_size):
+                    with metrics.timer('quality_filter'):
+                        masks = quality_filter.mask_groups([sentences for _, sentences, _ in batch])
+                    results = []
+                    for (doc_id, sentences, provenance), keep in zip(batch, masks):
+                        spans = [span for span, k in zip(provenance.spans, keep) if k]
+                        results.append((doc_id, [s for s, k in zip(sentences, keep) if k],
+                                        provenance._replace(spans=spans)))
+                    save_results(results, writer, processed_ids, dedup, metrics)
+            finally:
+                close_writer(writer, processed_ids, metrics, dedup)
+                if dedup is not None:
+                    dedup.log_stats()
+                logging.info(f"Metrics: {metrics.summary()}")
+    except Exception as e:
+        logging.error(f"Error refiltering sentences: {e}")
+        raise
+    finally:
+        segments.close()
 
 if __name__ == "__main__":
-    # Process all documents
-    data = list(fetch_jsonl_strings())
-    extract_sentences(data) 
\ No newline at end of file
+    # Stream and process all documents
+    extract_sentences(fetch_jsonl_strings()) 
\ No newline at end of file
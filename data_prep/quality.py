@@ -0,0 +1,153 @@
+import numpy as np
+
+# Character classes of the lookup table
+OTHER, ALPHA, DIGIT, SPACE = range(4)
+
+# Random 64 bit value of each lowercased code point and per-position weights of the token hash
+_rng = np.random.default_rng(0)
+CHAR_HASH_VALUES = _rng.integers(1, 2 ** 63, 0x10000, dtype=np.uint64)
+TOKEN_HASH_WEIGHTS = _rng.integers(1, 2 ** 63, 64, dtype=np.uint64) | np.uint64(1)
+
+# Character class and hash value of every code point of the Basic
+# Multilingual Plane, built on first use
+_char_tables = None
+
+def _get_char_tables():
+    """Return the character class and character hash lookup tables indexed by code point."""
+    global _char_tables
+    if _char_tables is None:
+        classes = np.full(0x10000, OTHER, dtype=np.uint8)
+        lower = np.arange(0x10000)
+        for code in range(0x10000):
+            c = chr(code)
+            if c.isalpha():
+                classes[code] = ALPHA
+                folded = c.lower()
+                if len(folded) == 1:
+                    lower[code] = ord(folded)
+            elif c.isdigit():
+                classes[code] = DIGIT
+            elif c.isspace():
+                classes[code] = SPACE
+        hashes = CHAR_HASH_VALUES[lower]
+        hashes[classes == SPACE] = 0
+        _char_tables = (classes, hashes)
+    return _char_tables
+
+def _segment_sums(values, starts, lengths, dtype=np.int32):
+    """Sum values over consecutive segments; each segment runs up to the next non-empty one."""
+    sums = np.zeros(len(starts), dtype=dtype)
+    nonempty = lengths > 0
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(values, starts[nonempty], dtype=dtype)
+    return sums
+
+def sentence_features(sentences):
+    """Compute quality features of a batch of sentences as NumPy arrays.
+
+    All sentences are concatenated and classified character by character
+    with lookup tables, then reduced per sentence, so the cost is a few array
+    passes per batch instead of Python loops per sentence. Ratios of letters
+    and digits are over non-whitespace characters; tokens are split on
+    whitespace, and the repeated and numeric token ratios are the fractions of
+    tokens that repeat an earlier token of the sentence (ignoring case) and
+    that contain a digit.
+    """
+    count = len(sentences)
+    lengths = np.fromiter((len(s) for s in sentences), dtype=np.int64, count=count)
+    starts = np.cumsum(lengths) - lengths
+    codes = np.frombuffer(''.join(sentences).encode('utf-32-le'), dtype=np.uint32)
+    # Characters outside the BMP map to U+FFFF, a non-character, and count as symbols
+    class_table, hash_table = _get_char_tables()
+    codes = np.minimum(codes, 0xFFFF)
+    classes = class_table[codes]
+    alpha = classes == ALPHA
+    digit = classes == DIGIT
+    space = classes == SPACE
+
+    # A token starts at a non-space character that follows a space or starts its sentence
+    previous_space = np.concatenate(([True], space[:-1]))
+    previous_space[starts[lengths > 0]] = True
+    token_start = ~space & previous_space
+    visible = np.maximum(lengths - _segment_sums(space, starts, lengths), 1)
+    tokens = _segment_sums(token_start, starts, lengths)
+
+    # Each token runs up to the next token start; spaces in between hash to zero
+    token_starts = np.flatnonzero(token_start)
+    token_lengths = np.diff(np.append(token_starts, len(codes)))
+    first = token_starts[0] if len(token_starts) else len(codes)
+    offsets = np.arange(first, len(codes)) - np.repeat(token_starts, token_lengths)
+    values = hash_table[codes[first:]] * TOKEN_HASH_WEIGHTS[offsets & (len(TOKEN_HASH_WEIGHTS) - 1)]
+    hashes = _segment_sums(values, token_starts - first, token_lengths, dtype=np.uint64)
+    has_digit = _segment_sums(digit[first:], token_starts - first, token_lengths) > 0
+
+    # Sorting (sentence, hash) keys gives the distinct tokens of each sentence
+    owners = np.repeat(np.arange(count, dtype=np.uint64), tokens)
+    keys = np.sort((owners << np.uint64(32)) | (hashes >> np.uint64(32)))
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+    distinct = np.bincount((keys[new_key] >> np.uint64(32)).astype(np.int64), minlength=count)
+    numeric = np.bincount(owners[has_digit].astype(np.int64), minlength=count)
+
+    safe_tokens = np.maximum(tokens, 1)
+    return {
+        'length': lengths,
+        'alpha_ratio': _segment_sums(alpha, starts, lengths) / visible,
+        'digit_ratio': _segment_sums(digit, starts, lengths) / visible,
+        'tokens': tokens,
+        'repeated_ratio': (tokens - distinct) / safe_tokens,
+        'numeric_token_ratio': numeric / safe_tokens
+    }
+
+class SentenceQualityFilter:
+    """Keep sentences whose features from sentence_features() are within thresholds.
+
+    The default length bounds are those of the original filter; the other
+    thresholds reject OCR debris such as digit-heavy table remnants,
+    coordinate strings and repeated tokens.
+    """
+
+    def __init__(self, min_length=10, max_length=500, min_alpha_ratio=0.5, max_digit_ratio=0.3,
+                 min_tokens=3, max_repeated_ratio=0.5, max_numeric_token_ratio=0.35):
+        self.min_length = min_length
+        self.max_length = max_length
+        self.min_alpha_ratio = min_alpha_ratio
+        self.max_digit_ratio = max_digit_ratio
+        self.min_tokens = min_tokens
+        self.max_repeated_ratio = max_repeated_ratio
+        self.max_numeric_token_ratio = max_numeric_token_ratio
+
+    def __repr__(self):
+        settings = ', '.join(f"{name}={value}" for name, value in vars(self).items())
+        return f"SentenceQualityFilter({settings})"
+
+    def mask(self, sentences):
+        """Return a boolean array marking the sentences that pass all thresholds."""
+        if not sentences:
+            return np.zeros(0, dtype=bool)
+        features = sentence_features(sentences)
+        return ((features['length'] >= self.min_length)
+                & (features['length'] <= self.max_length)
+                & (features['alpha_ratio'] >= self.min_alpha_ratio)
+                & (features['digit_ratio'] <= self.max_digit_ratio)
+                & (features['tokens'] >= self.min_tokens)
+                & (features['repeated_ratio'] <= self.max_repeated_ratio)
+                & (features['numeric_token_ratio'] <= self.max_numeric_token_ratio))
+
+    def filter(self, sentences):
+        """Return the sentences that pass all thresholds, in order."""
+        return [sentence for sentence, keep in zip(sentences, self.mask(sentences)) if keep]
+
+    def mask_groups(self, groups):
+        """Mask several sentence lists with one vectorized pass and return one boolean array per list."""
+        keep = self.mask([sentence for group in groups for sentence in group])
+        masks = []
+        position = 0
+        for group in groups:
+            masks.append(keep[position:position + len(group)])
+            position += len(group)
+        return masks
+
+    def filter_groups(self, groups):
+        """Filter several sentence lists with one vectorized pass and return the filtered lists."""
+        return [[s for s, k in zip(group, keep) if k] for group, keep in zip(groups, self.mask_groups(groups))]
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import json
+import logging
+from data_prep.parse_and_extract import make_document, partition_of
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Compression of the record batches; uncompressed batches are read zero-copy
+REPLAY_COMPRESSIONS = ('none', 'zstd', 'lz4')
+
+def _require_pyarrow():
+    """Raise ImportError if pyarrow is not installed."""
+    if pa is None:
+        raise ImportError("The replay cache requires the 'pyarrow' package")
+
+def replay_schema(metadata=None):
+    """Return the Arrow schema of a replay file, with optional key/value metadata."""
+    _require_pyarrow()
+    return pa.schema([
+        ('ctid', pa.string()),
+        ('custom_id', pa.string()),
+        ('page_index', pa.int32()),
+        ('markdown', pa.large_string())
+    ], metadata=metadata)
+
+def export_documents(documents, replay_file, batch_rows=10000, compression='none', metadata=None):
+    """Write Document rows to an Arrow IPC file that replay_documents() can read back.
+
+    Rows are written in record batches of `batch_rows` documents, compressed
+    with `compression` ('none', 'zstd' or 'lz4'). Compressed files are smaller
+    but every batch is decompressed on read; uncompressed ones are memory
+    mapped and read without copying. `metadata` (e.g. the fetch options) is
+    stored as JSON in the schema. The file is written under a temporary name
+    and renamed when complete. Returns the number of documents written.
+    """
+    _require_pyarrow()
+    if compression not in REPLAY_COMPRESSIONS:
+        raise ValueError(f"Unknown replay compression: {compression}")
+    schema = replay_schema({'replay': json.dumps(metadata or {})})
+    options = pa.ipc.IpcWriteOptions(compression=None if compression == 'none' else compression)
+    tmp_file = f"{replay_file}.tmp"
+    count = 0
+    try:
+        with pa.OSFile(tmp_file, 'wb') as sink, pa.ipc.new_file(sink, schema, options=options) as writer:
+            batch = []
+            for document in documents:
+                batch.append(document)
+                if len(batch) >= batch_rows:
+                    writer.write_batch(_record_batch(batch, schema))
+                    count += len(batch)
+                    batch = []
+                    logging.info(f"Exported {count} documents to {replay_file}")
+            if batch:
+                writer.write_batch(_record_batch(batch, schema))
+                count += len(batch)
+        os.replace(tmp_file, replay_file)
+    except Exception as e:
+        logging.error(f"Error exporting documents to {replay_file}: {e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+    logging.info(f"Exported {count} documents to {replay_file} ({os.path.getsize(replay_file)} bytes)")
+    return count
+
+def _record_batch(documents, schema):
+    """Return a record batch of Document rows."""
+    return pa.record_batch([
+        pa.array([d.ctid for d in documents], pa.string()),
+        pa.array([d.custom_id for d in documents], pa.string()),
+        pa.array([d.page_index for d in documents], pa.int32()),
+        pa.array([d.markdown for d in documents], pa.large_string())
+    ], schema=schema)
+
+def replay_metadata(replay_file):
+    """Return the metadata (the fetch options) stored with a replay file."""
+    _require_pyarrow()
+    with pa.memory_map(replay_file, 'r') as source:
+        return json.loads((pa.ipc.open_file(source).schema.metadata or {}).get(b'replay', b'{}'))
+
+def replay_documents(replay_file, shard_index=0, shard_count=1):
+    """Stream Document rows from a replay file written by export_documents().
+
+    The file is memory mapped, so record batches are paged in by the OS as
+    they are read instead of being loaded up front, and uncompressed batches
+    are not copied. Only the strings of the current batch are materialized as
+    Python objects. With `shard_count` > 1 only the documents in hash
+    partition `shard_index` (as in fetch_jsonl_strings) are yielded; a file
+    exported from one shard cannot be split into shards again.
+    """
+    _require_pyarrow()
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+    metadata = replay_metadata(replay_file)
+    logging.info(f"Replaying {replay_file}, exported with {metadata}")
+    if shard_count > 1 and metadata.get('shard_count', 1) > 1:
+        raise ValueError(f"{replay_file} holds shard {metadata['shard_index']} of {metadata['shard_count']} "
+                         f"already; replay it without --shard-count or export the full table")
+    try:
+        with pa.memory_map(replay_file, 'r') as source:
+            reader = pa.ipc.open_file(source)
+            logging.info(f"Replaying {reader.num_record_batches} record batches from {replay_file}")
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                columns = [batch.column(name).to_pylist() for name in ('ctid', 'custom_id', 'page_index', 'markdown')]
+                for ctid, custom_id, page_index, markdown in zip(*columns):
+                    if shard_count > 1 and partition_of(custom_id, shard_count) != shard_index:
+                        continue
+                    # Files exported before page numbers were parsed from custom_id hold page index 0
+                    yield make_document(ctid, custom_id, page_index, markdown)
+    except Exception as e:
+        logging.error(f"Error replaying documents from {replay_file}: {e}")
+        raise
\ No newline at end of file
@@ -0,0 +1,121 @@
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+from collections import namedtuple
+
+# Where the sentences of a document came from: the source row, the page
+# number, and the (start, end) offsets of each sentence in the cleaned text
+Provenance = namedtuple('Provenance', ['ctid', 'page_index', 'spans'])
+
+def text_hash(text):
+    """Return the 16 byte BLAKE2b digest of a cleaned text."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+def stripped_spans(doc, offset=0):
+    """Return (start, end) character offsets of the stripped, non-empty sentences of a spaCy doc.
+
+    Offsets are shifted by `offset`, for docs made from a slice of a longer text.
+    """
+    spans = []
+    for sent in doc.sents:
+        text = sent.text
+        start = sent.start_char + len(text) - len(text.lstrip())
+        end = sent.end_char - len(text) + len(text.rstrip())
+        if start < end:
+            spans.append((offset + start, offset + end))
+    return spans
+
+class SegmentStore:
+    """Persistent sentence boundaries of segmented documents, keyed by custom_id.
+
+    For each document the store keeps the cleaned text, its hash, and the
+    start and end character offsets of its sentences, before any quality
+    filter, as int32 arrays. Sentences can then be re-filtered with other
+    thresholds by slicing the stored text (see iter_documents()), without
+    loading an NLP model. The store lives in SQLite, so worker processes can
+    share one file.
+
+    `fingerprint` identifies the settings that produced the boundaries
+    (segmentation backend, markdown mode, chunk size); opening a store
+    written with other settings raises ValueError.
+    """
+
+    def __init__(self, segment_file='segments.sqlite', fingerprint=''):
+        self.segment_file = segment_file
+        self.fingerprint = fingerprint
+        self.pending = []
+
+        self.conn = sqlite3.connect(segment_file, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            self.conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS segments (
+                    custom_id TEXT PRIMARY KEY,
+                    ctid TEXT,
+                    page_index INTEGER,
+                    text_hash BLOB NOT NULL,
+                    text TEXT NOT NULL,
+                    starts BLOB NOT NULL,
+                    ends BLOB NOT NULL
+                )
+            """)
+            self.conn.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)',
+                              ('fingerprint', fingerprint))
+        stored = self.conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()[0]
+        if fingerprint and stored != fingerprint:
+            self.conn.close()
+            raise ValueError(f"{segment_file} was written with settings '{stored}', not '{fingerprint}'")
+
+    def put(self, document, text, spans):
+        """Queue the cleaned text and sentence spans of a Document for storage at the next commit."""
+        offsets = np.array(spans, dtype=np.int32).reshape(-1, 2)
+        self.pending.append((document.custom_id, document.ctid, document.page_index, text_hash(text), text,
+                             offsets[:, 0].tobytes(), offsets[:, 1].tobytes()))
+
+    def commit(self):
+        """Store queued documents, replacing earlier records of the same custom_id."""
+        if not self.pending:
+            return
+        with self.conn:
+            self.conn.executemany("""
+                INSERT OR REPLACE INTO segments (custom_id, ctid, page_index, text_hash, text, starts, ends)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, self.pending)
+        self.pending = []
+
+    def count(self):
+        """Return the number of stored documents."""
+        return self.conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]
+
+    def iter_documents(self, fetch_size=1000):
+        """Yield (custom_id, sentences, Provenance) for each stored document, in the order they were stored.
+
+        That is the extraction order with one worker; with several, whole
+        batches are stored in the order the workers finished them.
+
+        Sentences are sliced from the stored text at the stored offsets.
+        Documents whose text no longer matches its hash are logged and skipped.
+        """
+        cursor = self.conn.execute("""
+            SELECT custom_id, ctid, page_index, text_hash, text, starts, ends FROM segments ORDER BY rowid
+        """)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                return
+            for custom_id, ctid, page_index, digest, text, starts, ends in rows:
+                if text_hash(text) != digest:
+                    logging.error(f"Stored text of document {custom_id} does not match its hash; skipping")
+                    continue
+                starts = np.frombuffer(starts, dtype=np.int32).tolist()
+                ends = np.frombuffer(ends, dtype=np.int32).tolist()
+                spans = list(zip(starts, ends))
+                yield custom_id, [text[start:end] for start, end in spans], Provenance(ctid, page_index, spans)
+
+    def close(self):
+        """Commit pending documents and close the database."""
+        self.commit()
+        self.conn.close()
\ No newline at end of file
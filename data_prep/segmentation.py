@@ -0,0 +1,124 @@
+import sys
+import json
+import time
+import logging
+import spacy
+from data_prep.segment_store import stripped_spans
+
+# Sentence segmentation backends, from fastest to most accurate
+SEGMENTATION_BACKENDS = ('sentencizer', 'senter', 'parser')
+
+# Components of the trained pipelines that sentence segmentation never needs
+UNUSED_COMPONENTS = ['tagger', 'attribute_ruler', 'lemmatizer', 'ner']
+
+# Places to cut a long text into chunks, from most to least preferred
+CHUNK_BREAKS = ('\n\n', '\n', '. ', '? ', '! ', '; ', ' ')
+
+def load_segmenter(backend='senter', model='en_core_web_sm'):
+    """Load a spaCy pipeline that only does what sentence segmentation needs.
+
+    'sentencizer' uses the rule-based punctuation splitter on a blank pipeline,
+    'senter' uses the trained sentence recognizer on its own, and 'parser'
+    keeps the dependency parser for the most accurate boundaries.
+    """
+    if backend == 'sentencizer':
+        nlp = spacy.blank(model.split('_')[0])
+        nlp.add_pipe('sentencizer')
+    elif backend == 'senter':
+        nlp = spacy.load(model, exclude=UNUSED_COMPONENTS + ['parser', 'tok2vec'])
+        nlp.enable_pipe('senter')
+    elif backend == 'parser':
+        nlp = spacy.load(model, exclude=UNUSED_COMPONENTS + ['senter'])
+    else:
+        raise ValueError(f"Unknown segmentation backend: {backend}")
+
+    logging.info(f"Loaded '{backend}' segmenter with components: {nlp.pipe_names}")
+    return nlp
+
+def chunk_end(text, start, chunk_size):
+    """Return the end of the chunk of `text` starting at `start`.
+
+    The chunk is cut at the last paragraph, line, sentence or word break in
+    the second half of the `chunk_size` window, or at the window end if there
+    is none.
+    """
+    end = start + chunk_size
+    if end >= len(text):
+        return len(text)
+    for separator in CHUNK_BREAKS:
+        cut = text.rfind(separator, start + chunk_size // 2, end)
+        if cut != -1:
+            return cut + len(separator)
+    return end
+
+def segment_long_text_spans(nlp, text, chunk_size=50000):
+    """Segment a long text in chunks of at most chunk_size characters and return its sentence offsets.
+
+    Returns the (start, end) offsets in `text` of the stripped, non-empty
+    sentences. Only one chunk is in the pipeline at a time, which bounds
+    memory regardless of the text length. The last sentence of a chunk may be
+    cut off at the chunk edge, so it is dropped and the next chunk starts
+    where that sentence began; sentences longer than a chunk are split at the
+    edge.
+    """
+    spans = []
+    start = 0
+    while start < len(text):
+        end = chunk_end(text, start, chunk_size)
+        doc = nlp(text[start:end])
+        sents = list(doc.sents)
+        next_start = end
+        if end < len(text) and len(sents) > 1:
+            next_start = start + sents[-1].start_char
+            doc = doc[:sents[-1].start]
+        spans.extend(stripped_spans(doc, start))
+        start = next_start
+    return spans
+
+def sentence_boundaries(nlp, texts, batch_size=64):
+    """Return the set of sentence end offsets for each text."""
+    return [{sent.end_char for sent in doc.sents} for doc in nlp.pipe(texts, batch_size=batch_size)]
+
+def compare_backends(texts, backends=SEGMENTATION_BACKENDS, reference='parser',
+                     model='en_core_web_sm', batch_size=64):
+    """Segment the same texts with several backends and report speed and agreement.
+
+    Agreement is measured as precision, recall and F1 of each backend's sentence
+    boundaries against those of the `reference` backend.
+    """
+    texts = list(texts)
+    boundaries = {}
+    report = {}
+    for backend in backends:
+        nlp = load_segmenter(backend, model)
+        start = time.perf_counter()
+        boundaries[backend] = sentence_boundaries(nlp, texts, batch_size)
+        elapsed = time.perf_counter() - start
+        report[backend] = {
+            'sentences': sum(len(b) for b in boundaries[backend]),
+            'seconds': round(elapsed, 3),
+            'docs_per_sec': round(len(texts) / elapsed, 1) if elapsed else None
+        }
+
+    if reference in boundaries:
+        for backend in backends:
+            matched = sum(len(a & b) for a, b in zip(boundaries[backend], boundaries[reference]))
+            predicted = report[backend]['sentences']
+            expected = report[reference]['sentences']
+            precision = matched / predicted if predicted else 0.0
+            recall = matched / expected if expected else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            report[backend].update({
+                'precision': round(precision, 4),
+                'recall': round(recall, 4),
+                'f1': round(f1, 4)
+            })
+    return report
+
+if __name__ == "__main__":
+    # Compare backends on text files given on the command line, one document per file
+    documents = []
+    for path in sys.argv[1:]:
+        with open(path, 'r', encoding='utf-8') as f:
+            documents.append(f.read())
+    print(json.dumps(compare_backends(documents), indent=2))
@@ -1,31 +1,209 @@
 import os
+import json
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def upload_file_to_minio(filepath, bucket_name, object_name):
+# One S3 client shared by all uploads; boto3 clients are thread-safe
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+def get_s3_client():
+    """Return the shared S3 client for the MinIO endpoint, creating it on first use."""
+    global _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            _s3_client = boto3.client(
+                's3',
+                endpoint_url=os.getenv('MINIO_ENDPOINT'),
+                aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
+                aws_secret_access_key=os.getenv('MINIO_SECRET_KEY')
+            )
+        return _s3_client
+
+def get_transfer_config(part_size=64 * 1024 * 1024, max_concurrency=4):
+    """Return a transfer config that uploads files larger than part_size as concurrent multipart uploads."""
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency
+    )
+
+def upload_file_to_minio(filepath, bucket_name, object_name, s3_client=None, transfer_config=None, metadata=None):
     """Upload a file to MinIO bucket."""
     try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=os.getenv('MINIO_ENDPOINT'),
-            aws_access_key_id=os.getenv('MINIO_ACCESS_KEY'),
-            aws_secret_access_key=os.getenv('MINIO_SECRET_KEY')
-        )
-        
+        s3_client = s3_client or get_s3_client()
+
         # Check if file exists
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"File {filepath} not found")
-            
+
         # Upload file
-        s3_client.upload_file(filepath, bucket_name, object_name)
+        extra_args = {'Metadata': metadata} if metadata else None
+        s3_client.upload_file(filepath, bucket_name, object_name, ExtraArgs=extra_args, Config=transfer_config)
         print(f"Successfully uploaded {filepath} to {bucket_name}/{object_name}")
-        
+
     except Exception as e:
         print(f"Error uploading to MinIO: {e}")
         raise
 
+def file_sha256(filepath, chunk_size=1024 * 1024):
+    """Return the hex SHA-256 of a file."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_etag(filepath, part_size):
+    """Return the S3 ETag a file gets when uploaded with the given multipart threshold and part size."""
+    digests = []
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(part_size), b''):
+            digests.append(hashlib.md5(chunk).digest())
+    if os.path.getsize(filepath) < part_size:
+        # Files below the multipart threshold are uploaded in one request
+        return digests[0].hex() if digests else hashlib.md5(b'').hexdigest()
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+def sync_file_to_minio(filepath, bucket_name, object_name, s3_client=None, transfer_config=None):
+    """Upload a file only if the bucket does not already hold identical content.
+
+    Objects uploaded by this function carry the file's SHA-256 in their
+    metadata, which is compared first. Objects without it are compared by
+    ETag, computed locally with the transfer config's part size. Returns a
+    decision record describing what was done and why.
+    """
+    s3_client = s3_client or get_s3_client()
+    transfer_config = transfer_config or get_transfer_config()
+    local_sha256 = file_sha256(filepath)
+
+    try:
+        head = s3_client.head_object(Bucket=bucket_name, Key=object_name)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') not in ('404', 'NoSuchKey', 'NotFound'):
+            raise
+        action, reason = 'upload', 'missing in bucket'
+    else:
+        remote_sha256 = head.get('Metadata', {}).get('sha256')
+        if remote_sha256:
+            same = remote_sha256 == local_sha256
+            action, reason = ('skip', 'sha256 matches') if same else ('upload', 'sha256 differs')
+        else:
+            same = head['ETag'].strip('"') == compute_etag(filepath, transfer_config.multipart_chunksize)
+            action, reason = ('skip', 'etag matches') if same else ('upload', 'etag differs')
+
+    if action == 'upload':
+        upload_file_to_minio(filepath, bucket_name, object_name, s3_client, transfer_config,
+                             metadata={'sha256': local_sha256})
+    else:
+        print(f"Skipping unchanged {filepath} ({reason})")
+
+    return {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'path': str(filepath),
+        'bucket': bucket_name,
+        'object': object_name,
+        'action': action,
+        'reason': reason,
+        'sha256': local_sha256,
+        'bytes': os.path.getsize(filepath)
+    }
+
+def write_sync_log(decisions, log_file='sync_log.jsonl'):
+    """Append sync decision records to a JSON lines audit log."""
+    with open(log_file, 'a', encoding='utf-8') as f:
+        for decision in decisions:
+            f.write(json.dumps(decision) + '\n')
+
+class ShardUploader:
+    """Upload finished output files from a thread pool while extraction continues.
+
+    submit() can be passed as a writer's `on_shard_closed` callback so each
+    shard starts uploading as soon as it is closed. All uploads share one S3
+    client and a multipart transfer config with the given part size and
+    per-file concurrency. Pass `s3_client` to upload to a local stand-in such
+    as moto or a local MinIO server.
+
+    With `sync=True`, files whose content is already in the bucket are
+    skipped (see sync_file_to_minio), and every decision is kept in
+    `decisions` and appended to `sync_log`.
+    """
+
+    def __init__(self, bucket_name, prefix='', workers=4, part_size=64 * 1024 * 1024,
+                 max_concurrency=4, s3_client=None, sync=False, sync_log='sync_log.jsonl'):
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.s3_client = s3_client or get_s3_client()
+        self.transfer_config = get_transfer_config(part_size, max_concurrency)
+        self.sync = sync
+        self.sync_log = sync_log
+        self.decisions = []
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='upload')
+        self.futures = []
+        self.submitted = set()
+
+    def object_name(self, path):
+        """Return the bucket object name for a local file."""
+        name = os.path.basename(str(path))
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def submit(self, path, object_name=None):
+        """Queue a file for upload (or sync) and return its future."""
+        upload = sync_file_to_minio if self.sync else upload_file_to_minio
+        future = self.executor.submit(upload, str(path), self.bucket_name,
+                                      object_name or self.object_name(path),
+                                      self.s3_client, self.transfer_config)
+        self.futures.append(future)
+        self.submitted.add(str(path))
+        return future
+
+    def wait(self):
+        """Wait for all queued uploads, raising the first upload error, and return the number of files uploaded."""
+        try:
+            for future in self.futures:
+                result = future.result()
+                if self.sync:
+                    self.decisions.append(result)
+        finally:
+            self.executor.shutdown(wait=True)
+            if self.sync and self.decisions:
+                write_sync_log(self.decisions, self.sync_log)
+        if self.sync:
+            return sum(1 for decision in self.decisions if decision['action'] == 'upload')
+        return len(self.futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.wait()
+        else:
+            self.executor.shutdown(wait=True)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload output files to the MinIO bucket.")
+    parser.add_argument('paths', nargs='*', default=['sentences.txt'],
+                        help="Files or directories to upload (directories are uploaded file by file)")
+    parser.add_argument('--prefix', default='', help="Object name prefix in the bucket")
+    parser.add_argument('--sync', action='store_true', help="Skip files whose content is already in the bucket")
+    args = parser.parse_args()
+
     bucket_name = os.getenv('MINIO_BUCKET_NAME')
-    upload_file_to_minio('sentences.txt', bucket_name, 'sentences.txt') 
\ No newline at end of file
+    with ShardUploader(bucket_name, prefix=args.prefix, sync=args.sync) as uploader:
+        for path in args.paths:
+            if os.path.isdir(path):
+                for name in sorted(os.listdir(path)):
+                    if os.path.isfile(os.path.join(path, name)):
+                        uploader.submit(os.path.join(path, name))
+            else:
+                uploader.submit(path)
\ No newline at end of file
@@ -0,0 +1,522 @@
+import os
+import gzip
+import json
+import time
+import zlib
+import hashlib
+import logging
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# File name suffix of each shard compression
+SHARD_SUFFIXES = {'gzip': '.txt.gz', 'zstd': '.txt.zst', 'none': '.txt'}
+
+def shard_documents(output_dir, entry):
+    """Return the [doc_id, sentence count] list of a shard from its manifest entry.
+
+    Manifests written before the lists moved to `documents_file` sidecars
+    hold them inline.
+    """
+    if 'documents' in entry:
+        return entry['documents']
+    with open(Path(output_dir) / entry['documents_file'], 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class SentenceWriter:
+    """Append sentences to a text file in group commits recorded in a journal.
+
+    Sentences of many documents are buffered and written with one append per
+    flush. Each flush records the byte range it wrote and the CRC32 of those
+    bytes as one line of the journal, and the file is fsynced at most every
+    `fsync_interval` seconds. On open, anything past the last journaled batch,
+    or a last batch whose CRC does not match, is treated as a torn tail and
+    truncated.
+
+    add() and flush() return the IDs of documents whose sentences have been
+    committed, so callers checkpoint a document only once it is on disk.
+    """
+
+    def __init__(self, output_file='sentences.txt', journal_file=None,
+                 flush_documents=256, flush_bytes=1 << 20, fsync_interval=5.0):
+        self.output_file = Path(output_file)
+        self.journal_file = Path(journal_file) if journal_file else Path(f"{output_file}.journal")
+        self.flush_documents = flush_documents
+        self.flush_bytes = flush_bytes
+        self.fsync_interval = fsync_interval
+        self.pending = []
+        self.pending_ids = []
+        self.pending_bytes = 0
+        self.pending_sentences = 0
+        self.last_fsync = time.monotonic()
+
+        self.size = self.recover()
+        self.handle = open(self.output_file, 'ab')
+        self.journal = open(self.journal_file, 'a', encoding='utf-8')
+
+    def _read_journal(self):
+        """Return the (start, length, crc, documents) entries of the journal and whether any line was malformed."""
+        entries = []
+        malformed = False
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 4 or not line.endswith('\n'):
+                    logging.warning(f"Ignoring malformed journal line in {self.journal_file}: {line!r}")
+                    malformed = True
+                    continue
+                start, length, crc, documents = parts
+                entries.append((int(start), int(length), None if crc == '-' else int(crc, 16), int(documents)))
+        return entries, malformed
+
+    def _batch_intact(self, start, length, crc, documents):
+        """Check that a journaled batch is fully present in the output file."""
+        if start + length > self.output_file.stat().st_size:
+            return False
+        if crc is None:
+            return True
+        with open(self.output_file, 'rb') as f:
+            f.seek(start)
+            return zlib.crc32(f.read(length)) == crc
+
+    def _last_line_end(self, file_size, chunk_size=1 << 16):
+        """Return the offset just past the last newline of the output file, or 0 if it has none."""
+        with open(self.output_file, 'rb') as f:
+            end = file_size
+            while end > 0:
+                start = max(0, end - chunk_size)
+                f.seek(start)
+                index = f.read(end - start).rfind(b'\n')
+                if index >= 0:
+                    return start + index + 1
+                end = start
+        return 0
+
+    def recover(self):
+        """Truncate any torn tail of the output file and return its committed size."""
+        if not self.output_file.exists():
+            self.output_file.touch()
+        file_size = self.output_file.stat().st_size
+
+        if not self.journal_file.exists():
+            # Adopt the complete lines of an existing output file as one unverified batch
+            complete = self._last_line_end(file_size)
+            if complete < file_size:
+                logging.warning(f"Truncating {file_size - complete} bytes of a torn last line from {self.output_file}")
+                with open(self.output_file, 'r+b') as f:
+                    f.truncate(complete)
+                file_size = complete
+            with open(self.journal_file, 'w', encoding='utf-8') as f:
+                if file_size:
+                    f.write(f"0 {file_size} - 0\n")
+            return file_size
+
+        entries, malformed = self._read_journal()
+        kept = len(entries)
+        while kept and not self._batch_intact(*entries[kept - 1]):
+            kept -= 1
+        committed = entries[kept - 1][0] + entries[kept - 1][1] if kept else 0
+
+        if kept < len(entries):
+            logging.warning(f"Dropping {len(entries) - kept} torn batches from {self.journal_file}")
+        if kept < len(entries) or malformed:
+            with open(self.journal_file, 'w', encoding='utf-8') as f:
+                for start, length, crc, documents in entries[:kept]:
+                    f.write(f"{start} {length} {'-' if crc is None else format(crc, '08x')} {documents}\n")
+        if file_size > committed:
+            logging.warning(f"Truncating {file_size - committed} uncommitted bytes from {self.output_file}")
+            with open(self.output_file, 'r+b') as f:
+                f.truncate(committed)
+        return committed
+
+    def add(self, doc_id, sentences, provenance=None):
+        """Buffer the sentences of one document and return the IDs committed by any resulting flush.
+
+        Text output has no provenance columns, so `provenance` is ignored.
+        """
+        if sentences:
+            data = ('\n'.join(sentences) + '\n').encode('utf-8')
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+            self.pending_sentences += len(sentences)
+        self.pending_ids.append(doc_id)
+        if len(self.pending_ids) >= self.flush_documents or self.pending_bytes >= self.flush_bytes:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Write buffered sentences as one batch, journal it, and return the committed document IDs."""
+        committed = self.pending_ids
+        if self.pending:
+            data = b''.join(self.pending)
+            self.handle.write(data)
+            self.handle.flush()
+            self._maybe_fsync()
+            self.journal.write(f"{self.size} {len(data)} {zlib.crc32(data):08x} {len(committed)}\n")
+            self.journal.flush()
+            self.size += len(data)
+            logging.info(f"Committed {len(committed)} documents ({self.pending_sentences} sentences, {len(data)} bytes)")
+
+        self.pending = []
+        self.pending_ids = []
+        self.pending_bytes = 0
+        self.pending_sentences = 0
+        return committed
+
+    def _maybe_fsync(self, force=False):
+        """fsync the output file if the fsync interval has elapsed."""
+        now = time.monotonic()
+        if force or now - self.last_fsync >= self.fsync_interval:
+            os.fsync(self.handle.fileno())
+            self.last_fsync = now
+
+    def close(self):
+        """Flush remaining sentences, fsync both files and return the last committed IDs."""
+        committed = self.flush()
+        if not self.handle.closed:
+            self._maybe_fsync(force=True)
+            self.handle.close()
+            os.fsync(self.journal.fileno())
+            self.journal.close()
+        return committed
+
+class _HashingFile:
+    """Write-only file wrapper that tracks the SHA-256 and size of the bytes written."""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.handle.write(data)
+
+    def flush(self):
+        self.handle.flush()
+
+class ShardedSentenceWriter:
+    """Write sentences into compressed shards rotated by sentence count or size.
+
+    Shards are written as `<prefix>-<index>.txt.gz` (or `.txt.zst`, `.txt`)
+    in `output_dir`. A shard is first written under a `.part` name; when it
+    reaches `max_sentences` sentences or `max_bytes` uncompressed bytes it is
+    closed, fsynced and renamed, and `manifest.json` is rewritten with its
+    sentence and document counts, compressed size and SHA-256. The IDs of the
+    documents it covers, with their sentence counts, are written next to it
+    in `<shard name>.documents.json` (see shard_documents), so the manifest
+    stays small however many documents the output holds.
+
+    Documents are committed (returned by add, flush and close) only when the
+    shard holding them is closed. A `.part` shard left by a crash is discarded
+    on open, and its documents are processed again because they were never
+    checkpointed.
+    """
+
+    def __init__(self, output_dir='sentences', prefix='sentences', compression='gzip',
+                 max_sentences=1000000, max_bytes=256 << 20, compression_level=None,
+                 on_shard_closed=None):
+        if compression not in SHARD_SUFFIXES:
+            raise ValueError(f"Unknown shard compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            raise ImportError("zstd shard compression requires the 'zstandard' package")
+
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.compression = compression
+        self.max_sentences = max_sentences
+        self.max_bytes = max_bytes
+        self.compression_level = compression_level
+        self.on_shard_closed = on_shard_closed
+        self.manifest_file = self.output_dir / 'manifest.json'
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = self.load_manifest()
+        for stale in self.output_dir.glob(f"{self.prefix}-*.part"):
+            logging.warning(f"Removing incomplete shard {stale}")
+            stale.unlink()
+        self.shard = None
+
+    def load_manifest(self):
+        """Load the manifest of closed shards, or start an empty one."""
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'shards': []}
+
+    def write_manifest(self):
+        """Atomically replace the manifest on disk."""
+        tmp_file = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.manifest_file)
+
+    @property
+    def shard_paths(self):
+        """Paths of all closed shards and their document lists, in order."""
+        paths = []
+        for shard in self.manifest['shards']:
+            if 'documents_file' in shard:
+                paths.append(self.output_dir / shard['documents_file'])
+            paths.append(self.output_dir / shard['name'])
+        return paths
+
+    def documents_file(self, name):
+        """Return the file name of the document list of a shard."""
+        return f"{name}.documents.json"
+
+    def write_documents(self, name, documents):
+        """Atomically write the [doc_id, sentence count] list of a shard and return its path."""
+        path = self.output_dir / self.documents_file(name)
+        tmp_file = path.with_name(path.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(documents, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        return path
+
+    def _open_shard(self):
+        """Start a new .part shard after the last one in the manifest."""
+        index = len(self.manifest['shards'])
+        name = f"{self.prefix}-{index:05d}{SHARD_SUFFIXES[self.compression]}"
+        handle = open(self.output_dir / f"{name}.part", 'wb')
+        hashing = _HashingFile(handle)
+        if self.compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=hashing, mode='wb', mtime=0,
+                                   compresslevel=self.compression_level or 6)
+        elif self.compression == 'zstd':
+            cctx = zstandard.ZstdCompressor(level=self.compression_level or 3)
+            stream = cctx.stream_writer(hashing, closefd=False)
+        else:
+            stream = hashing
+        self.shard = {
+            'name': name, 'handle': handle, 'hashing': hashing, 'stream': stream,
+            'sentences': 0, 'uncompressed_bytes': 0, 'documents': []
+        }
+
+    def add(self, doc_id, sentences, provenance=None):
+        """Write the sentences of one document and return the IDs committed by any shard rotation.
+
+        Text shards have no provenance columns, so `provenance` is ignored.
+        """
+        if self.shard is None:
+            self._open_shard()
+        if sentences:
+            data = ('\n'.join(sentences) + '\n').encode('utf-8')
+            self.shard['stream'].write(data)
+            self.shard['uncompressed_bytes'] += len(data)
+            self.shard['sentences'] += len(sentences)
+        self.shard['documents'].append([doc_id, len(sentences)])
+
+        if self.shard['sentences'] >= self.max_sentences or self.shard['uncompressed_bytes'] >= self.max_bytes:
+            return self.close_shard()
+        return []
+
+    def close_shard(self):
+        """Finish the current shard, record it in the manifest and return its document IDs."""
+        shard = self.shard
+        self.shard = None
+        if shard is None:
+            return []
+
+        if shard['stream'] is not shard['hashing']:
+            shard['stream'].close()
+        shard['handle'].flush()
+        os.fsync(shard['handle'].fileno())
+        shard['handle'].close()
+
+        path = self.output_dir / shard['name']
+        os.replace(self.output_dir / f"{shard['name']}.part", path)
+        documents = shard['documents']
+        documents_path = self.write_documents(shard['name'], documents)
+        entry = {
+            'name': shard['name'],
+            'compression': self.compression,
+            'sentences': shard['sentences'],
+            'document_count': len(documents),
+            'bytes': shard['hashing'].size,
+            'uncompressed_bytes': shard['uncompressed_bytes'],
+            'sha256': shard['hashing'].sha256.hexdigest(),
+            'first_doc_id': documents[0][0],
+            'last_doc_id': documents[-1][0],
+            'documents_file': documents_path.name
+        }
+        self.manifest['shards'].append(entry)
+        self.write_manifest()
+        logging.info(f"Closed shard {path} with {entry['sentences']} sentences from "
+                     f"{entry['document_count']} documents ({entry['bytes']} bytes)")
+
+        if self.on_shard_closed:
+            self.on_shard_closed(documents_path)
+            self.on_shard_closed(path)
+        return [doc_id for doc_id, _ in documents]
+
+    def flush(self):
+        """Shards are only committed when closed, so flushing commits nothing."""
+        return []
+
+    def close(self):
+        """Close the current shard, if any, and return its document IDs."""
+        return self.close_shard()
+
+
+class ParquetSentenceWriter(ShardedSentenceWriter):
+    """Write sentences with their provenance into Parquet files rotated by row count.
+
+    Each row is one sentence with the columns doc_id (the source ctid),
+    custom_id, page_index, sentence_index (its position among the written
+    sentences of the page), char_start and char_end (its offsets in the
+    cleaned page text), length and text. doc_id and custom_id are dictionary
+    encoded. Rows are buffered and written in row groups of `row_group_size`
+    rows, so readers can prune columns and skip row groups by their
+    statistics.
+
+    Files are written as `<prefix>-<index>.parquet` in `output_dir`, under a
+    `.part` name until they reach `max_rows` rows, and recorded in
+    `_manifest.json` like the shards of a ShardedSentenceWriter, with their
+    document lists in `_<file name>.documents.json`. The leading underscore
+    makes Parquet dataset readers skip these files, so the directory can be
+    read as one dataset. Documents are committed only when the file holding
+    them is closed, and a `.part` file left by a crash is discarded on open.
+    """
+
+    def __init__(self, output_dir='sentences', prefix='sentences', compression='zstd',
+                 max_rows=1000000, row_group_size=100000, compression_level=None, on_shard_closed=None):
+        if pa is None:
+            raise ImportError("Parquet output requires the 'pyarrow' package")
+        self.output_dir = Path(output_dir)
+        self.prefix = prefix
+        self.compression = compression
+        self.max_rows = max_rows
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self.on_shard_closed = on_shard_closed
+        self.manifest_file = self.output_dir / '_manifest.json'
+        self.schema = pa.schema([
+            ('doc_id', pa.dictionary(pa.int32(), pa.string())),
+            ('custom_id', pa.dictionary(pa.int32(), pa.string())),
+            ('page_index', pa.int32()),
+            ('sentence_index', pa.int32()),
+            ('char_start', pa.int32()),
+            ('char_end', pa.int32()),
+            ('length', pa.int32()),
+            ('text', pa.string())
+        ])
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.manifest = self.load_manifest()
+        for stale in self.output_dir.glob(f"{self.prefix}-*.parquet.part"):
+            logging.warning(f"Removing incomplete Parquet file {stale}")
+            stale.unlink()
+        self.shard = None
+        self.rows = self._empty_rows()
+
+    def documents_file(self, name):
+        """Return the file name of the document list of a Parquet file, hidden from dataset readers."""
+        return f"_{name}.documents.json"
+
+    def _empty_rows(self):
+        """Return empty column buffers for the next row group."""
+        return {name: [] for name in self.schema.names}
+
+    def _open_shard(self):
+        """Start a new .part file after the last one in the manifest."""
+        name = f"{self.prefix}-{len(self.manifest['shards']):05d}.parquet"
+        writer = pq.ParquetWriter(self.output_dir / f"{name}.part", self.schema,
+                                  compression=self.compression, compression_level=self.compression_level,
+                                  use_dictionary=['doc_id', 'custom_id'])
+        self.shard = {'name': name, 'writer': writer, 'rows': 0, 'row_groups': 0, 'documents': []}
+
+    def add(self, doc_id, sentences, provenance=None):
+        """Buffer the sentences of one document and return the IDs committed by any file rotation.
+
+        `provenance` is the document's Provenance; without one, doc_id,
+        page_index and the offsets are written as nulls.
+        """
+        if self.shard is None:
+            self._open_shard()
+        spans = provenance.spans if provenance is not None else [(None, None)] * len(sentences)
+        rows = self.rows
+        for sentence_index, (sentence, (start, end)) in enumerate(zip(sentences, spans)):
+            rows['doc_id'].append(provenance.ctid if provenance is not None else None)
+            rows['custom_id'].append(doc_id)
+            rows['page_index'].append(provenance.page_index if provenance is not None else None)
+            rows['sentence_index'].append(sentence_index)
+            rows['char_start'].append(start)
+            rows['char_end'].append(end)
+            rows['length'].append(len(sentence))
+            rows['text'].append(sentence)
+        self.shard['documents'].append([doc_id, len(sentences)])
+
+        if len(rows['text']) >= self.row_group_size:
+            self._write_row_group(self.shard)
+        if self.shard['rows'] >= self.max_rows:
+            return self.close_shard()
+        return []
+
+    def _write_row_group(self, shard):
+        """Write the buffered rows as one row group of a file."""
+        if not self.rows['text']:
+            return
+        table = pa.Table.from_pydict(self.rows, schema=self.schema)
+        shard['writer'].write_table(table, row_group_size=len(table))
+        shard['rows'] += len(table)
+        shard['row_groups'] += 1
+        self.rows = self._empty_rows()
+
+    def close_shard(self):
+        """Finish the current file, record it in the manifest and return its document IDs."""
+        shard = self.shard
+        self.shard = None
+        if shard is None:
+            return []
+
+        self._write_row_group(shard)
+        shard['writer'].close()
+        part = self.output_dir / f"{shard['name']}.part"
+        with open(part, 'rb') as f:
+            os.fsync(f.fileno())
+            sha256 = hashlib.sha256()
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+
+        path = self.output_dir / shard['name']
+        os.replace(part, path)
+        documents = shard['documents']
+        documents_path = self.write_documents(shard['name'], documents)
+        entry = {
+            'name': shard['name'],
+            'format': 'parquet',
+            'compression': self.compression,
+            'sentences': shard['rows'],
+            'row_groups': shard['row_groups'],
+            'document_count': len(documents),
+            'bytes': path.stat().st_size,
+            'sha256': sha256.hexdigest(),
+            'first_doc_id': documents[0][0],
+            'last_doc_id': documents[-1][0],
+            'documents_file': documents_path.name
+        }
+        self.manifest['shards'].append(entry)
+        self.write_manifest()
+        logging.info(f"Closed Parquet file {path} with {entry['sentences']} sentences in "
+                     f"{entry['row_groups']} row groups from {entry['document_count']} documents "
+                     f"({entry['bytes']} bytes)")
+
+        if self.on_shard_closed:
+            self.on_shard_closed(documents_path)
+            self.on_shard_closed(path)
+        return [doc_id for doc_id, _ in documents]
\ No newline at end of file
@@ -1,6 +1,14 @@
-from data_prep.parse_and_extract import fetch_jsonl_strings, extract_sentences
-from data_prep.upload_to_minio import upload_file_to_minio
+from data_prep.parse_and_extract import fetch_jsonl_strings, extract_sentences, refilter_sentences
+from data_prep.async_pipeline import run_async_pipeline
+from data_prep.upload_to_minio import ShardUploader
+from data_prep.writer import SentenceWriter, ShardedSentenceWriter, ParquetSentenceWriter
+from data_prep.dedup import SentenceDeduplicator
+from data_prep.page_filter import PageFilter
+from data_prep.quality import SentenceQualityFilter
+from data_prep.metrics import PipelineMetrics
+from data_prep.replay_cache import export_documents, replay_documents, REPLAY_COMPRESSIONS
 import os
+import argparse
 import logging
 from dotenv import load_dotenv
 
@@ -14,27 +22,291 @@ logging.basicConfig(
     ]
 )
 
-def main():
+def parse_args():
+    """Parse command line options for the pipeline."""
+    parser = argparse.ArgumentParser(description="Extract sentences from JSONL documents and upload them to MinIO.")
+    parser.add_argument('--mode', choices=['sample', 'random', 'scan'], default='sample',
+                        help="'sample' takes a seeded, repeatable TABLESAMPLE, 'random' sorts the table randomly, "
+                             "'scan' streams the full table once")
+    parser.add_argument('--limit', type=int, default=2000, help="Number of documents to sample in sample/random mode")
+    parser.add_argument('--sample-percent', type=float, default=None,
+                        help="Percentage of the table to sample in sample mode (derived from --limit if omitted)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for sample mode; the same seed returns the same documents")
+    parser.add_argument('--sample-method', choices=['SYSTEM', 'BERNOULLI'], default='SYSTEM',
+                        help="SYSTEM samples whole blocks (fastest), BERNOULLI samples individual rows")
+    parser.add_argument('--shard-index', type=int, default=0, help="Which shard of the source rows this node processes")
+    parser.add_argument('--shard-count', type=int, default=1,
+                        help="Number of shards the source rows are split into, one per node or process")
+    parser.add_argument('--partition-by', choices=['hash', 'ctid'], default='hash',
+                        help="'hash' assigns rows by a hash of custom_id (any mode), "
+                             "'ctid' assigns whole heap block ranges (scan mode only)")
+    parser.add_argument('--export-replay', default=None,
+                        help="Fetch documents with the options above into this Arrow replay file and exit")
+    parser.add_argument('--replay-compression', choices=REPLAY_COMPRESSIONS, default='none',
+                        help="Compression of the exported replay file; 'none' allows zero-copy reads")
+    parser.add_argument('--replay', default=None,
+                        help="Read documents from an Arrow replay file instead of PostgreSQL "
+                             "(shards are assigned by custom_id hash)")
+    parser.add_argument('--batch-size', type=int, default=100,
+                        help="Documents between progress log lines in random mode (rows are fetched --itersize "
+                             "at a time)")
+    parser.add_argument('--blocks-per-batch', type=int, default=1000, help="Heap blocks read per query in scan mode")
+    parser.add_argument('--itersize', type=int, default=2000, help="Rows fetched per round trip by the server-side cursor")
+    parser.add_argument('--prefetch', type=int, default=10000,
+                        help="Maximum number of documents read ahead of processing (0 disables read-ahead)")
+    parser.add_argument('--backend', choices=['sentencizer', 'senter', 'parser'], default='senter',
+                        help="Sentence segmentation backend: rule-based, trained sentence recognizer, or full parser")
+    parser.add_argument('--nlp-batch-size', type=int, default=64, help="Documents per nlp.pipe batch")
+    parser.add_argument('--chunk-size', type=int, default=50000,
+                        help="Pages longer than this many characters are segmented in chunks of at most this size")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of extraction worker processes (0 uses one per CPU core)")
+    parser.add_argument('--markdown-mode', choices=['fast', 'full', 'verify'], default='fast',
+                        help="'fast' strips markdown line by line, 'full' renders it to HTML, "
+                             "'verify' runs both and logs any differences")
+    parser.add_argument('--no-page-filter', dest='page_filter', action='store_false',
+                        help="Process every page, including table-only and numeric pages")
+    parser.add_argument('--min-page-words', type=int, default=8,
+                        help="Skip pages with fewer alphabetic words outside tables")
+    parser.add_argument('--min-alpha-ratio', type=float, default=0.3,
+                        help="Skip pages whose non-whitespace characters outside tables are less than this fraction letters")
+    parser.add_argument('--max-table-ratio', type=float, default=0.95,
+                        help="Skip pages with more than this fraction of lines in pipe tables "
+                             "and fewer than --min-page-words words outside them")
+    parser.add_argument('--min-sentence-length', type=int, default=10, help="Minimum sentence length in characters")
+    parser.add_argument('--max-sentence-length', type=int, default=500, help="Maximum sentence length in characters")
+    parser.add_argument('--min-sentence-alpha', type=float, default=0.5,
+                        help="Minimum fraction of letters among a sentence's non-whitespace characters")
+    parser.add_argument('--max-sentence-digits', type=float, default=0.3,
+                        help="Maximum fraction of digits among a sentence's non-whitespace characters")
+    parser.add_argument('--min-sentence-tokens', type=int, default=3, help="Minimum number of tokens in a sentence")
+    parser.add_argument('--max-repeated-tokens', type=float, default=0.5,
+                        help="Maximum fraction of a sentence's tokens that repeat an earlier token")
+    parser.add_argument('--max-numeric-tokens', type=float, default=0.35,
+                        help="Maximum fraction of a sentence's tokens that contain a digit")
+    parser.add_argument('--cache-file', default=None,
+                        help="SQLite file caching sentences by page content, so duplicate pages are processed once")
+    parser.add_argument('--cache-size', type=int, default=200000, help="Maximum number of pages kept in the cache")
+    parser.add_argument('--segment-file', default=None,
+                        help="SQLite file that keeps the cleaned text and sentence offsets of each page for --refilter")
+    parser.add_argument('--refilter', action='store_true',
+                        help="Regenerate the output from --segment-file with the current quality filter flags, "
+                             "without fetching or segmenting")
+    parser.add_argument('--dedup', choices=['none', 'exact', 'near'], default='none',
+                        help="Drop sentences already written: 'exact' ignores case and whitespace only, "
+                             "'near' also drops sentences similar to an earlier one (MinHash/LSH)")
+    parser.add_argument('--dedup-capacity', type=int, default=20000000,
+                        help="Unique sentences the deduplication filters are sized for")
+    parser.add_argument('--dedup-error-rate', type=float, default=0.001,
+                        help="False positive rate of the deduplication filters at capacity")
+    parser.add_argument('--dedup-state', default=None,
+                        help="File keeping the deduplication filters across runs")
+    parser.add_argument('--flush-documents', type=int, default=256,
+                        help="Documents buffered per group-committed write to the output file")
+    parser.add_argument('--fsync-interval', type=float, default=5.0,
+                        help="Minimum seconds between fsync calls on the output file (0 syncs every write)")
+    parser.add_argument('--output-format', choices=['text', 'sharded', 'parquet'], default='text',
+                        help="'text' appends to sentences.txt, 'sharded' writes rotated, compressed shards with a manifest, "
+                             "'parquet' writes rotated Parquet files with provenance columns and a manifest")
+    parser.add_argument('--output-dir', default='sentences', help="Directory for sharded and Parquet output")
+    parser.add_argument('--compression', choices=['gzip', 'zstd', 'none'], default='gzip',
+                        help="Compression of sharded or Parquet output (zstd shards require the zstandard package)")
+    parser.add_argument('--row-group-size', type=int, default=100000, help="Sentences per Parquet row group")
+    parser.add_argument('--shard-max-sentences', type=int, default=1000000, help="Sentences per shard before rotating")
+    parser.add_argument('--shard-max-bytes', type=int, default=256 << 20,
+                        help="Uncompressed bytes per shard before rotating")
+    parser.add_argument('--upload-workers', type=int, default=4, help="Files uploaded concurrently")
+    parser.add_argument('--upload-part-size', type=int, default=64 * 1024 * 1024,
+                        help="Multipart upload part size in bytes")
+    parser.add_argument('--upload-concurrency', type=int, default=4, help="Concurrent parts per multipart upload")
+    parser.add_argument('--sync', action='store_true',
+                        help="Only upload files whose content differs from the bucket; decisions go to sync_log.jsonl")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="Run fetch, processing and writing as overlapping asyncio stages")
+    parser.add_argument('--queue-size', type=int, default=1000,
+                        help="Maximum number of fetched documents buffered between async stages")
+    parser.add_argument('--report-interval', type=float, default=10.0,
+                        help="Seconds between queue depth reports in async mode")
+    parser.add_argument('--metrics-file', default='pipeline_metrics.json',
+                        help="File the run's stage timings and throughput are written to at the end; "
+                             "Prometheus text format if it ends in .prom, JSON otherwise")
+    parser.add_argument('--metrics-interval', type=float, default=60.0,
+                        help="Seconds between metrics summary log lines")
+    return parser.parse_args()
+
+def shard_path(path, tag):
+    """Insert a shard tag before the extension of a file name, so each shard gets its own file."""
+    if not tag:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{tag}{ext}"
+
+def main(args):
     """Main pipeline function to process JSONL data and upload results."""
     try:
         # Load environment variables
         load_dotenv()
         
+        if args.export_replay:
+            # Dump the fetched documents so later runs can replay them without the database
+            documents = fetch_jsonl_strings(
+                mode=args.mode,
+                limit=args.limit,
+                batch_size=args.batch_size,
+                blocks_per_batch=args.blocks_per_batch,
+                sample_percent=args.sample_percent,
+                seed=args.seed,
+                sample_method=args.sample_method,
+                itersize=args.itersize,
+                prefetch=args.prefetch,
+                shard_index=args.shard_index,
+                shard_count=args.shard_count,
+                partition_by=args.partition_by
+            )
+            fetch_options = {key: getattr(args, key) for key in
+                             ('mode', 'limit', 'sample_percent', 'seed', 'sample_method',
+                              'shard_index', 'shard_count', 'partition_by')}
+            export_documents(documents, args.export_replay, compression=args.replay_compression,
+                             metadata=fetch_options)
+            return
+        
+        bucket_name = os.getenv('MINIO_BUCKET_NAME')
+        if not bucket_name:
+            raise ValueError("MINIO_BUCKET_NAME not set in environment variables")
+        
         # Process documents and extract sentences
         logging.info("Starting sentence extraction pipeline...")
-        output_file = 'sentences.txt'
+        # Each shard of a partitioned run has its own output, checkpoint and metrics files
+        tag = f"shard-{args.shard_index:04d}-of-{args.shard_count:04d}" if args.shard_count > 1 else ''
+        output_file = shard_path('sentences.txt', tag)
+        checkpoint_file = shard_path('processed_ids.log', tag)
+        metrics_file = shard_path(args.metrics_file, tag)
+        output_dir = os.path.join(args.output_dir, tag) if tag else args.output_dir
+        segment_file = args.segment_file and shard_path(args.segment_file, tag)
+        if args.refilter:
+            if not segment_file:
+                raise ValueError("--refilter needs the --segment-file of an earlier extraction")
+            # The extraction checkpoint lists every stored document, so refiltering keeps its own
+            checkpoint_file = shard_path('refilter_ids.log', tag)
+            existing = {'text': output_file, 'sharded': os.path.join(output_dir, 'manifest.json'),
+                        'parquet': os.path.join(output_dir, '_manifest.json')}[args.output_format]
+            if os.path.exists(existing) and not os.path.exists(checkpoint_file):
+                raise ValueError(f"{existing} already exists; move the earlier output away before refiltering")
+        prefix = ''
+        if args.output_format != 'text':
+            prefix = os.path.basename(os.path.normpath(args.output_dir))
+            prefix = f"{prefix}/{tag}" if tag else prefix
+        uploader = ShardUploader(bucket_name, prefix=prefix, workers=args.upload_workers,
+                                 part_size=args.upload_part_size, max_concurrency=args.upload_concurrency,
+                                 sync=args.sync)
+        if args.output_format == 'sharded':
+            # Shards start uploading as soon as they are closed, while extraction continues
+            writer = ShardedSentenceWriter(output_dir, compression=args.compression,
+                                           max_sentences=args.shard_max_sentences,
+                                           max_bytes=args.shard_max_bytes,
+                                           on_shard_closed=uploader.submit)
+        elif args.output_format == 'parquet':
+            writer = ParquetSentenceWriter(output_dir, compression=args.compression,
+                                           max_rows=args.shard_max_sentences,
+                                           row_group_size=args.row_group_size,
+                                           on_shard_closed=uploader.submit)
+        else:
+            writer = SentenceWriter(output_file, flush_documents=args.flush_documents,
+                                    fsync_interval=args.fsync_interval)
+        dedup = None
+        if args.dedup != 'none':
+            dedup = SentenceDeduplicator(args.dedup_capacity, args.dedup_error_rate,
+                                         near_duplicates=args.dedup == 'near',
+                                         state_file=args.dedup_state and shard_path(args.dedup_state, tag))
+        quality_filter = SentenceQualityFilter(args.min_sentence_length, args.max_sentence_length,
+                                               args.min_sentence_alpha, args.max_sentence_digits,
+                                               args.min_sentence_tokens, args.max_repeated_tokens,
+                                               args.max_numeric_tokens)
+        metrics = PipelineMetrics(args.metrics_interval)
+        page_filter = None
+        if args.page_filter:
+            page_filter = PageFilter(args.min_page_words, args.min_alpha_ratio, args.max_table_ratio)
         
         # Fetch and process documents
-        jsonl_data = fetch_jsonl_strings()
-        extract_sentences(jsonl_data, output_file)
+        if args.refilter:
+            refilter_sentences(segment_file, output_file, checkpoint_file, writer=writer, dedup=dedup,
+                               quality_filter=quality_filter, metrics=metrics)
+        elif args.replay:
+            if args.use_async:
+                logging.info("Replay files are read without the async fetch stage")
+            documents = replay_documents(args.replay, args.shard_index, args.shard_count)
+            extract_sentences(documents, output_file, checkpoint_file, backend=args.backend, batch_size=args.nlp_batch_size,
+                              workers=args.workers, markdown_mode=args.markdown_mode, writer=writer,
+                              cache_file=args.cache_file, cache_size=args.cache_size, dedup=dedup,
+                              page_filter=page_filter, quality_filter=quality_filter,
+                              chunk_size=args.chunk_size, metrics=metrics, segment_file=segment_file)
+        elif args.use_async:
+            run_async_pipeline(
+                output_file,
+                checkpoint_file,
+                backend=args.backend,
+                batch_size=args.nlp_batch_size,
+                workers=args.workers,
+                markdown_mode=args.markdown_mode,
+                queue_size=args.queue_size,
+                itersize=args.itersize,
+                report_interval=args.report_interval,
+                writer=writer,
+                cache_file=args.cache_file,
+                cache_size=args.cache_size,
+                dedup=dedup,
+                page_filter=page_filter,
+                quality_filter=quality_filter,
+                chunk_size=args.chunk_size,
+                metrics=metrics,
+                segment_file=segment_file,
+                mode=args.mode,
+                limit=args.limit,
+                blocks_per_batch=args.blocks_per_batch,
+                sample_percent=args.sample_percent,
+                seed=args.seed,
+                sample_method=args.sample_method,
+                shard_index=args.shard_index,
+                shard_count=args.shard_count,
+                partition_by=args.partition_by
+            )
+        else:
+            documents = fetch_jsonl_strings(
+                mode=args.mode,
+                limit=args.limit,
+                batch_size=args.batch_size,
+                blocks_per_batch=args.blocks_per_batch,
+                sample_percent=args.sample_percent,
+                seed=args.seed,
+                sample_method=args.sample_method,
+                itersize=args.itersize,
+                prefetch=args.prefetch,
+                shard_index=args.shard_index,
+                shard_count=args.shard_count,
+                partition_by=args.partition_by
+            )
+            extract_sentences(documents, output_file, checkpoint_file, backend=args.backend, batch_size=args.nlp_batch_size,
+                              workers=args.workers, markdown_mode=args.markdown_mode, writer=writer,
+                              cache_file=args.cache_file, cache_size=args.cache_size, dedup=dedup,
+                              page_filter=page_filter, quality_filter=quality_filter,
+                              chunk_size=args.chunk_size, metrics=metrics, segment_file=segment_file)
         
-        # Upload results to MinIO
+        # Upload the remaining results to MinIO
         logging.info("Uploading results to MinIO...")
-        bucket_name = os.getenv('MINIO_BUCKET_NAME')
-        if not bucket_name:
-            raise ValueError("MINIO_BUCKET_NAME not set in environment variables")
-            
-        upload_file_to_minio(output_file, bucket_name, output_file)
+        if args.output_format != 'text':
+            if args.sync:
+                # Reconcile every shard of the output, including those of earlier runs whose upload failed
+                for path in writer.shard_paths:
+                    if str(path) not in uploader.submitted:
+                        uploader.submit(path)
+            # The manifest goes last, once every shard it lists has been queued
+            uploader.submit(writer.manifest_file)
+        else:
+            uploader.submit(output_file)
+        with metrics.timer('upload'):
+            uploaded = uploader.wait()
+        logging.info(f"Uploaded {uploaded} files")
+        metrics.write(metrics_file)
         logging.info("Pipeline completed successfully")
         
     except Exception as e:
@@ -42,4 +314,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main(parse_args()) 
\ No newline at end of file
@@ -0,0 +1,61 @@
+import os
+import json
+import tempfile
+from data_prep.checkpoint import CheckpointJournal
+
+def read_file(path):
+    """Return the contents of a text file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def test_torn_last_line():
+    """A last line without its newline is dropped on open, and new IDs start on a fresh line."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal_file = os.path.join(tmp_dir, 'processed_ids.log')
+        with open(journal_file, 'w', encoding='utf-8') as f:
+            f.write('A000001_P1\nA000001_P2\nA000001_P')
+        with CheckpointJournal(journal_file, legacy_file=None) as journal:
+            assert journal.ids == {'A000001_P1', 'A000001_P2'}
+            assert 'A000001_P' not in journal
+            journal.add('A000001_P3')
+        assert read_file(journal_file) == 'A000001_P1\nA000001_P2\nA000001_P3\n'
+        print("Torn last line dropped")
+
+def test_legacy_migration_drops_ctids():
+    """The JSON checkpoint is migrated once, without its obsolete ctid entries."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal_file = os.path.join(tmp_dir, 'processed_ids.log')
+        legacy_file = os.path.join(tmp_dir, 'processed_ids.json')
+        with open(legacy_file, 'w', encoding='utf-8') as f:
+            json.dump(['(13302,8)', 'A000001_P1', '(0,1)', 'A000002_P7'], f)
+        with CheckpointJournal(journal_file, legacy_file=legacy_file) as journal:
+            assert journal.ids == {'A000001_P1', 'A000002_P7'}
+        # The journal now exists, so a changed legacy file is not read again
+        with open(legacy_file, 'w', encoding='utf-8') as f:
+            json.dump(['A000003_P1'], f)
+        with CheckpointJournal(journal_file, legacy_file=legacy_file) as journal:
+            assert journal.ids == {'A000001_P1', 'A000002_P7'}
+        print("Legacy checkpoint migrated without ctids")
+
+def test_reopen_after_crash():
+    """IDs added before a crash (without close) are loaded again, and are not appended twice."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal_file = os.path.join(tmp_dir, 'processed_ids.log')
+        crashed = CheckpointJournal(journal_file, legacy_file=None)
+        crashed.add('A000001_P1')
+        crashed.add('A000001_P2')
+        crashed.add('A000001_P1')
+        # No close(): the process dies here; add() has already flushed each line
+        with CheckpointJournal(journal_file, legacy_file=None) as journal:
+            assert len(journal) == 2 and 'A000001_P2' in journal
+            journal.add('A000001_P2')
+            journal.add('A000001_P3')
+        crashed.handle.close()
+        assert read_file(journal_file).splitlines() == ['A000001_P1', 'A000001_P2', 'A000001_P3']
+        print("Journal reopened after a crash")
+
+if __name__ == "__main__":
+    test_torn_last_line()
+    test_legacy_migration_drops_ctids()
+    test_reopen_after_crash()
+    print("Checkpoint journal checks passed")
\ No newline at end of file
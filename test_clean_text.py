@@ -0,0 +1,78 @@
+import json
+import random
+from data_prep.parse_and_extract import clean_text, clean_text_legacy, markdown_to_text, strip_markdown
+
+# Hand-written cases around the patterns the compiled cleaner rewrote
+EDGE_CASES = [
+    "See http://www.example.com/report.pdf for details.",
+    "Data from https://geo.gov.bc.ca/minfile?id=104M%2F015&x=1, accessed 2006.",
+    "Visit http://a.b/c)d(e),f* and HTTP://UPPER.CASE now",
+    "Contact j.smith@aurora-geo.com or info@troymet.ca.",
+    "Emails: a@b.co, bad@host, x.y+z@sub.domain.org; @alone and trailing@",
+    "Email first.last@example.com.au... then text!!",
+    "Wait... what?!?! Really;; yes:: no,, maybe..",
+    "Grade ( 2.5 g/t ) over 3.0 m , and 1.2 % Cu ; see Table 1 : results .",
+    "Coordinates 59°52'14\" N, 131°12' W ± 5 m © 2006 • bullet",
+    "$59^{\\circ} 52^{\\prime} 14^{\\prime \\prime}$ latitude",
+    "Tabs\tand\nnewlines\r\nand non-breaking spaces",
+    "Unicode letters: Québec, Montréal, naïve façade; Ωmega, 日本語 text.",
+    "Underscores_and-dashes/slashes (parentheses) [brackets] {braces} <angles>",
+    "...leading punctuation and trailing ,.;",
+    "   ",
+    "",
+    "mailto:someone@example.com?subject=hi https://x.y/a@b.cd",
+    "http://",
+    "a@b.c d@e.fg",
+]
+
+def load_sample_pages(path='sample_jsonl.json'):
+    """Return the markdown of every page in the sample batch API record."""
+    with open(path, 'r', encoding='utf-8') as f:
+        record = json.load(f)
+    return [page['markdown'] for page in record['response']['body']['pages']]
+
+def fuzz_strings(count=20000, seed=0):
+    """Yield random strings drawn from an alphabet weighted toward URL, email and punctuation characters."""
+    rng = random.Random(seed)
+    pieces = ['http://', 'https://', '@', '.', ',', '!', '?', ';', ':', '..', '-', '_', '/', '%2F', '(', ')',
+              ' ', ' ', '\n', '\t', 'a', 'Z', 'x1', '.com', '.ca', 'é', '°', '$', '*', '&', '+', '#', '|', '©']
+    for _ in range(count):
+        yield ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 40)))
+
+def check(texts, label):
+    """Assert clean_text and clean_text_legacy agree on every text and report how many were compared."""
+    compared = 0
+    for text in texts:
+        expected = clean_text_legacy(text)
+        actual = clean_text(text)
+        assert actual == expected, f"{label}: clean_text differs on {text!r}: {actual!r} != {expected!r}"
+        compared += 1
+    print(f"{label}: {compared} texts identical")
+
+def test_sample_sentences():
+    """Compare the cleaners on the sentences of sample_sentences.txt."""
+    with open('sample_sentences.txt', 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    check(lines + ['\n'.join(lines)], 'sample_sentences.txt')
+
+def test_sample_pages():
+    """Compare the cleaners on the sample pages, raw and after both markdown converters."""
+    pages = load_sample_pages()
+    check(pages, 'sample_jsonl.json markdown')
+    check([markdown_to_text(page) for page in pages], 'sample_jsonl.json full conversion')
+    check([strip_markdown(page) for page in pages], 'sample_jsonl.json fast conversion')
+
+def test_edge_cases():
+    """Compare the cleaners on punctuation-, URL- and email-heavy cases."""
+    check(EDGE_CASES, 'edge cases')
+
+def test_fuzz():
+    """Compare the cleaners on reproducible random strings."""
+    check(fuzz_strings(), 'fuzz')
+
+if __name__ == "__main__":
+    test_sample_sentences()
+    test_sample_pages()
+    test_edge_cases()
+    test_fuzz()
+    print("clean_text matches clean_text_legacy")
\ No newline at end of file
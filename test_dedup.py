@@ -0,0 +1,99 @@
+import os
+import random
+import tempfile
+from data_prep.dedup import BloomFilter, SentenceDeduplicator, sentence_digest
+from data_prep.parse_and_extract import Document, extract_sentences
+
+def random_digests(count, seed):
+    """Return distinct pseudo-random 16 byte digests."""
+    rng = random.Random(seed)
+    return list({rng.randbytes(16) for _ in range(count)})
+
+def test_bloom_false_positive_rate():
+    """At its configured capacity the Bloom filter stays near its configured false positive rate."""
+    capacity, error_rate = 50000, 0.01
+    bloom = BloomFilter(capacity, error_rate)
+    added = random_digests(capacity, seed=1)
+    assert bloom.add_new(added).all()
+    assert not bloom.add_new(added[:1000]).any()
+    probes = random_digests(50000, seed=2)
+    false_positives = sum(1 for digest in probes if bloom.contains_any([digest]))
+    rate = false_positives / len(probes)
+    print(f"Bloom filter false positive rate at capacity: {rate:.4f} (configured {error_rate})")
+    assert rate < error_rate * 1.5
+
+def test_exact_duplicates():
+    """Sentences equal up to case and whitespace are dropped, once per corpus."""
+    dedup = SentenceDeduplicator(capacity=1000)
+    assert sentence_digest('The  Report.') == sentence_digest('the report.')
+    assert dedup.filter(['The report.', 'Gold was found.', 'the  REPORT.']) == ['The report.', 'Gold was found.']
+    assert dedup.filter(['Gold was found.', 'New sentence here.']) == ['New sentence here.']
+    assert dedup.counts == {'sentences': 5, 'exact_duplicates': 2, 'near_duplicates': 0}
+
+def test_near_duplicates():
+    """MinHash LSH drops sentences that differ in one word and keeps unrelated ones."""
+    dedup = SentenceDeduplicator(capacity=1000, near_duplicates=True)
+    base = ("The diamond drill program on the northern claim block tested the quartz vein system "
+            "with twelve holes totalling two thousand metres of core")
+    variant = base.replace('twelve', 'eleven')
+    unrelated = "Soil samples collected along the southern grid returned anomalous copper values near the creek"
+    assert dedup.filter([base]) == [base]
+    assert dedup.filter([variant]) == []
+    assert dedup.filter([unrelated]) == [unrelated]
+    assert dedup.counts['near_duplicates'] == 1
+    print(f"Near duplicate dropped above Jaccard ~{dedup.near.threshold:.2f}")
+
+def test_state_round_trip():
+    """Saved filters are loaded by a new deduplicator, and must match its configuration."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state_file = os.path.join(tmp_dir, 'dedup_state.npz')
+        dedup = SentenceDeduplicator(capacity=1000, near_duplicates=True, state_file=state_file)
+        dedup.filter(['First sentence of the corpus here.', 'Second sentence of the corpus here.'])
+        dedup.save()
+        loaded = SentenceDeduplicator(capacity=1000, near_duplicates=True, state_file=state_file)
+        assert loaded.exact.count == dedup.exact.count == 2
+        assert loaded.filter(['first sentence of the corpus here.', 'A third one.']) == ['A third one.']
+        try:
+            SentenceDeduplicator(capacity=5000, state_file=state_file)
+        except ValueError:
+            return
+        raise AssertionError("State of another capacity was loaded")
+
+def failing_documents(documents, fail_after):
+    """Yield documents, then raise as a crashed fetch would."""
+    for document in documents[:fail_after]:
+        yield document
+    raise RuntimeError("injected fetch failure")
+
+def test_state_saved_after_failed_run():
+    """A run that fails still saves the filters of the sentences it committed."""
+    pages = ["The survey covered the claim block in June. Gold was found in the creek.",
+             "Assays were done by fire assay at the lab. Results are listed in the table.",
+             "Gold was found in the creek. The camp was closed in October of that year."]
+    documents = [Document(f"(0,{i + 1})", f"A000001_P{i}", i, page) for i, page in enumerate(pages)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'sentences.txt')
+        checkpoint_file = os.path.join(tmp_dir, 'processed_ids.log')
+        state_file = os.path.join(tmp_dir, 'dedup_state.npz')
+        options = {'backend': 'sentencizer', 'legacy_file': None}
+        try:
+            extract_sentences(failing_documents(documents, 2), output_file, checkpoint_file,
+                              dedup=SentenceDeduplicator(capacity=1000, state_file=state_file), **options)
+        except RuntimeError:
+            pass
+        assert os.path.exists(state_file)
+        extract_sentences(documents, output_file, checkpoint_file,
+                          dedup=SentenceDeduplicator(capacity=1000, state_file=state_file), **options)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        print(f"Resumed run wrote {lines[4:]}")
+        assert lines.count('Gold was found in the creek.') == 1
+        assert lines[-1] == 'The camp was closed in October of that year.'
+
+if __name__ == "__main__":
+    test_bloom_false_positive_rate()
+    test_exact_duplicates()
+    test_near_duplicates()
+    test_state_round_trip()
+    test_state_saved_after_failed_run()
+    print("Deduplication checks passed")
\ No newline at end of file
@@ -0,0 +1,38 @@
+from data_prep.parse_and_extract import Document
+from data_prep.page_filter import PageFilter, page_features
+
+# Two sentences of prose above a 20-row drill collar table
+MIXED_PAGE = "\n".join(
+    ["# 10.0 DRILLING",
+     "",
+     "The 2019 program comprised twenty diamond drill holes totalling 4,120 m on the Golden Eagle claims. "
+     "Collar locations were surveyed with a handheld GPS and are listed in Table 10.1.",
+     "",
+     "| Hole | Easting | Northing | Elevation | Azimuth | Dip | Length (m) |",
+     "| :--: | :--: | :--: | :--: | :--: | :--: | :--: |"]
+    + [f"| GE19-{i:02d} | {612000 + i * 37} | {5201000 + i * 53} | {412 + i} | {i * 15 % 360} | -{45 + i % 3 * 5} | {150 + i * 7} |"
+       for i in range(1, 21)]
+)
+
+# A table-only page, as in sample_jsonl.json
+TABLE_PAGE = "\n".join(
+    ["| Sample | Easting | Northing | Type |", "| :--: | :--: | :--: | :--: |"]
+    + [f"| {400000 + i} | {600000 + i * 11} | {5190000 + i * 13} | Outcrop |" for i in range(40)]
+)
+
+def test_mixed_page_is_kept():
+    """A page with real prose above a long table must not be skipped."""
+    features = page_features(MIXED_PAGE)
+    print(f"Mixed page features: {features}")
+    reason = PageFilter().skip_reason(Document('(0,1)', 'TEST_P1', 1, MIXED_PAGE))
+    assert reason is None, f"Mixed prose and table page skipped as '{reason}'"
+
+def test_table_page_is_skipped():
+    """A page made only of a table is skipped as a table."""
+    reason = PageFilter().skip_reason(Document('(0,2)', 'TEST_P2', 2, TABLE_PAGE))
+    assert reason == 'table', f"Table-only page not skipped as a table: {reason}"
+
+if __name__ == "__main__":
+    test_mixed_page_is_kept()
+    test_table_page_is_skipped()
+    print("Page filter checks passed")
\ No newline at end of file
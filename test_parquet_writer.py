@@ -0,0 +1,77 @@
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from data_prep.parse_and_extract import make_document, page_number, process_batch, convert_markdown, clean_text
+from data_prep.segmentation import load_segmenter
+from data_prep.writer import ParquetSentenceWriter
+
+PAGES = [
+    ('(12,3)', 'A001380_P165', "# Summary\n\nThe drill program tested the northern zone. "
+                               "Quartz veins carried visible gold in three holes."),
+    ('(12,4)', 'A001380_P166', "Assays were done by fire assay. Results are listed below.\n\n"
+                               "Hole 3 returned the best grades of the program."),
+    ('(40,1)', 'B000021_P2', "Geological mapping covered the claim block. Outcrop is scarce in the valley.")
+]
+
+def test_page_number():
+    """Page numbers come from the _P<n> suffix of custom_id, falling back to the page index."""
+    assert page_number('A001380_P165', 0) == 165
+    assert page_number('A001380_P7', 0) == 7
+    assert page_number('A001380', 0) == 0
+    assert page_number('A001380_P165x', 3) == 3
+    assert make_document('(1,1)', 'A001380_P165', 0, 'text').page_index == 165
+
+def test_parquet_round_trip():
+    """Provenance columns read back from Parquet locate every sentence in its cleaned page text."""
+    documents = [make_document(ctid, custom_id, 0, markdown) for ctid, custom_id, markdown in PAGES]
+    results = process_batch(load_segmenter('sentencizer'), documents)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = ParquetSentenceWriter(tmp_dir, row_group_size=4)
+        committed = []
+        for doc_id, sentences, provenance in results:
+            committed += writer.add(doc_id, sentences, provenance)
+        committed += writer.close()
+        assert committed == [custom_id for _, custom_id, _ in PAGES]
+
+        table = pq.read_table(tmp_dir)
+        schema = pq.read_schema(writer.shard_paths[-1])
+        assert pa.types.is_dictionary(schema.field('doc_id').type)
+        assert pa.types.is_dictionary(schema.field('custom_id').type)
+        assert pq.ParquetFile(writer.shard_paths[-1]).metadata.num_row_groups > 1
+        rows = table.to_pylist()
+        print(f"Read {len(rows)} sentences back from {len(writer.shard_paths)} files")
+
+        texts = {custom_id: clean_text(convert_markdown(markdown)) for _, custom_id, markdown in PAGES}
+        expected = [(document, sentences) for document, (_, sentences, _) in zip(documents, results)]
+        assert len(rows) == sum(len(sentences) for _, sentences in expected)
+        position = 0
+        for document, sentences in expected:
+            for sentence_index, sentence in enumerate(sentences):
+                row = rows[position]
+                position += 1
+                assert row['doc_id'] == document.ctid
+                assert row['custom_id'] == document.custom_id
+                assert row['page_index'] == page_number(document.custom_id)
+                assert row['sentence_index'] == sentence_index
+                assert row['text'] == sentence
+                assert row['length'] == len(sentence)
+                assert texts[document.custom_id][row['char_start']:row['char_end']] == sentence
+
+        pages = pq.read_table(tmp_dir, columns=['custom_id'], filters=[('page_index', '=', 166)])
+        assert set(pages.column('custom_id').to_pylist()) == {'A001380_P166'}
+
+def test_missing_provenance():
+    """Documents added without provenance get null provenance columns."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = ParquetSentenceWriter(tmp_dir)
+        writer.add('A001380_P1', ['One sentence.'])
+        writer.close()
+        row = pq.read_table(tmp_dir).to_pylist()[0]
+        assert row['doc_id'] is None and row['page_index'] is None and row['char_start'] is None
+        assert row['custom_id'] == 'A001380_P1' and row['text'] == 'One sentence.'
+
+if __name__ == "__main__":
+    test_page_number()
+    test_parquet_round_trip()
+    test_missing_provenance()
+    print("Parquet writer checks passed")
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os
+import tempfile
+from data_prep.parse_and_extract import Document, partition_of, make_partition, PARTITION_HASH_FILTER
+from data_prep.replay_cache import export_documents, replay_documents
+
+# First 8 hex digits of md5(custom_id), as PostgreSQL reads them with
+# ('x' || substr(md5(custom_id), 1, 8))::bit(32)::bigint: an unsigned 32-bit value
+KNOWN_PREFIXES = {
+    '': 0xd41d8cd9,
+    'A001380_P165': 0x5b65cbe8,
+    'A001380_P166': 0x00db9ad1,
+    'B000021_P2': 0xf55446d6,
+    'BENCH00000_P0': 0x30e72a09,
+}
+
+def make_documents(count=1000):
+    """Return documents with distinct custom_ids across many reports and pages."""
+    return [Document(f"({i // 10},{i % 10 + 1})", f"A{i // 50:06d}_P{i % 50}", i % 50, f"Page {i} text.")
+            for i in range(count)]
+
+def test_partition_of_matches_sql():
+    """partition_of reduces the same unsigned md5 prefix as the SQL filter, including prefixes above 2**31."""
+    assert "substr(md5(jsonl_cont->>'custom_id'), 1, 8))::bit(32)::bigint" in PARTITION_HASH_FILTER
+    for custom_id, prefix in KNOWN_PREFIXES.items():
+        for shard_count in (1, 2, 3, 4, 7, 16, 1000):
+            assert partition_of(custom_id, shard_count) == prefix % shard_count, (custom_id, shard_count)
+    print(f"partition_of matches {len(KNOWN_PREFIXES)} known md5 prefixes")
+
+def test_every_shard_index_is_used():
+    """Every shard index receives documents, in roughly equal shares."""
+    documents = make_documents()
+    for shard_count in (2, 4, 7):
+        sizes = [0] * shard_count
+        for document in documents:
+            sizes[partition_of(document.custom_id, shard_count)] += 1
+        print(f"{shard_count} shards: {sizes}")
+        assert min(sizes) > len(documents) / shard_count / 2
+
+def test_replay_shards_partition_exactly():
+    """The shards of a replay file together yield every document exactly once."""
+    documents = make_documents()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        replay_file = os.path.join(tmp_dir, 'pages.arrow')
+        export_documents(documents, replay_file, batch_rows=128)
+        for shard_count in (1, 3, 4):
+            seen = []
+            for shard_index in range(shard_count):
+                shard = [document.custom_id for document in replay_documents(replay_file, shard_index, shard_count)]
+                assert all(partition_of(custom_id, shard_count) == shard_index for custom_id in shard)
+                seen.extend(shard)
+            assert len(seen) == len(set(seen)), f"Shards of {shard_count} overlap"
+            assert set(seen) == {document.custom_id for document in documents}, f"Shards of {shard_count} miss rows"
+        print(f"Replay shards partition {len(documents)} documents exactly")
+
+def test_invalid_shard():
+    """Out of range shard indexes are rejected."""
+    for shard_index, shard_count in ((2, 2), (-1, 2), (0, 0)):
+        try:
+            make_partition(shard_index, shard_count)
+        except ValueError:
+            continue
+        raise AssertionError(f"Shard {shard_index} of {shard_count} was accepted")
+
+if __name__ == "__main__":
+    test_partition_of_matches_sql()
+    test_every_shard_index_is_used()
+    test_replay_shards_partition_exactly()
+    test_invalid_shard()
+    print("Partition checks passed")
\ No newline at end of file
@@ -0,0 +1,53 @@
+import os
+import tempfile
+from data_prep.parse_and_extract import Document, process_batch, extract_sentences
+from data_prep.quality import SentenceQualityFilter
+from data_prep.segmentation import load_segmenter
+
+# A sentence that makes the injected filter fail, as a bug in any batch stage would
+POISON = 'This sentence breaks the quality filter.'
+
+class FailingQualityFilter(SentenceQualityFilter):
+    """Quality filter that raises for any group of sentences containing POISON."""
+
+    def mask_groups(self, groups):
+        groups = list(groups)
+        if any(POISON in sentences for sentences in groups):
+            raise RuntimeError("injected failure")
+        return super().mask_groups(groups)
+
+def make_documents():
+    """Return five documents, the third of which fails to process."""
+    pages = [f"Report {i} describes the drill program on the claim. Gold was found in quartz veins."
+             for i in range(5)]
+    pages[2] = f"The third page has an ordinary first sentence. {POISON}"
+    return [Document(f"(0,{i + 1})", f"A000001_P{i}", i, page) for i, page in enumerate(pages)]
+
+def test_failing_document_is_skipped():
+    """A document that fails a batch stage is skipped; the rest of its batch is processed."""
+    nlp = load_segmenter('sentencizer')
+    documents = make_documents()
+    results = process_batch(nlp, documents, quality_filter=FailingQualityFilter())
+    assert [doc_id for doc_id, _, _ in results] == [document.custom_id for document in documents]
+    assert results[2][1:] == (None, None)
+    healthy = process_batch(nlp, documents[:2] + documents[3:])
+    assert results[:2] + results[3:] == healthy
+    print(f"Processed {len(healthy)} documents and skipped {results[2][0]}")
+
+def test_failing_document_in_worker_pool():
+    """With worker processes the run completes and checkpoints every document but the failing one."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'sentences.txt')
+        checkpoint_file = os.path.join(tmp_dir, 'processed_ids.log')
+        extract_sentences(make_documents(), output_file, checkpoint_file, backend='sentencizer', batch_size=5,
+                          workers=2, quality_filter=FailingQualityFilter(), legacy_file=None)
+        with open(checkpoint_file, 'r', encoding='utf-8') as f:
+            checkpointed = f.read().split()
+        assert sorted(checkpointed) == ['A000001_P0', 'A000001_P1', 'A000001_P3', 'A000001_P4']
+        with open(output_file, 'r', encoding='utf-8') as f:
+            assert POISON not in f.read()
+
+if __name__ == "__main__":
+    test_failing_document_is_skipped()
+    test_failing_document_in_worker_pool()
+    print("process_batch failure checks passed")
\ No newline at end of file
@@ -0,0 +1,141 @@
+import random
+import numpy as np
+from data_prep.quality import SentenceQualityFilter, sentence_features
+
+def char_class(c):
+    """Return the class of a character as sentence_features() sees it; non-BMP characters are symbols."""
+    if ord(c) > 0xFFFF:
+        return 'other'
+    if c.isalpha():
+        return 'alpha'
+    if c.isdigit():
+        return 'digit'
+    if c.isspace():
+        return 'space'
+    return 'other'
+
+def fold(token):
+    """Lowercase the letters of a token one by one, and map non-BMP characters to U+FFFF."""
+    folded = []
+    for c in token:
+        if ord(c) > 0xFFFF:
+            folded.append('￿')
+        elif c.isalpha() and len(c.lower()) == 1:
+            folded.append(c.lower())
+        else:
+            folded.append(c)
+    return ''.join(folded)
+
+def reference_features(sentence):
+    """Compute the features of one sentence with plain Python."""
+    classes = [char_class(c) for c in sentence]
+    visible = max(len(sentence) - classes.count('space'), 1)
+    tokens = sentence.split()
+    return {
+        'length': len(sentence),
+        'alpha_ratio': classes.count('alpha') / visible,
+        'digit_ratio': classes.count('digit') / visible,
+        'tokens': len(tokens),
+        'repeated_ratio': (len(tokens) - len({fold(t) for t in tokens})) / max(len(tokens), 1),
+        'numeric_token_ratio': sum(any(char_class(c) == 'digit' for c in t) for t in tokens) / max(len(tokens), 1)
+    }
+
+def reference_keep(quality_filter, sentence):
+    """Apply the thresholds of a SentenceQualityFilter to one sentence with plain Python."""
+    f = reference_features(sentence)
+    return (quality_filter.min_length <= f['length'] <= quality_filter.max_length
+            and f['alpha_ratio'] >= quality_filter.min_alpha_ratio
+            and f['digit_ratio'] <= quality_filter.max_digit_ratio
+            and f['tokens'] >= quality_filter.min_tokens
+            and f['repeated_ratio'] <= quality_filter.max_repeated_ratio
+            and f['numeric_token_ratio'] <= quality_filter.max_numeric_token_ratio)
+
+SENTENCES = [
+    "The drill program tested the northern zone.",
+    "59 circ 52 prime 14 prime prime latitude",
+    "Au Au Au Au gold gold",
+    "THE the The tHe assay results were good.",
+    "Short.",
+    "Hole DH-12 returned 2.5 g/t over 3.0 m.",
+    "   Leading and trailing   spaces are kept  ",
+    "Québec and Montréal reports, naïve façade; Ωmega ÆON straße.",
+    "𝐆𝐨𝐥𝐝 was found in the creek bed near camp.",
+    "Results 😀 😃 😀 were posted on the board today.",
+    "Table ２０１９ and ٣ digits from other scripts.",
+    "a" * 600,
+    "",
+    "1 2 3 4 5 6 7 8",
+    "Ⅷ Roman numerals ⅷ and ligature ﬁ in text",
+]
+
+def check(quality_filter, sentences, label):
+    """Assert the vectorized filter and the reference agree on every sentence."""
+    expected = [reference_keep(quality_filter, sentence) for sentence in sentences]
+    actual = quality_filter.mask(sentences).tolist()
+    for sentence, e, a in zip(sentences, expected, actual):
+        assert e == a, f"{label}: {quality_filter!r} differs on {sentence!r}: {a} != {e}"
+    print(f"{label}: {len(sentences)} sentences, {sum(actual)} kept")
+
+def test_features_match_reference():
+    """Every feature matches the per-sentence reference, including non-BMP characters."""
+    features = sentence_features(SENTENCES)
+    for index, sentence in enumerate(SENTENCES):
+        for name, value in reference_features(sentence).items():
+            assert np.isclose(features[name][index], value), (sentence, name, features[name][index], value)
+
+def test_non_bmp_characters_are_symbols():
+    """Letters outside the BMP (e.g. mathematical bold) do not count as letters, but as one symbol each."""
+    features = sentence_features(["𝐆𝐨𝐥𝐝 ore", "Gold ore"])
+    assert features['length'].tolist() == [8, 8]
+    assert features['alpha_ratio'][0] == 3 / 7 and features['alpha_ratio'][1] == 1.0
+    assert features['tokens'].tolist() == [2, 2]
+
+def test_default_thresholds():
+    """The default filter keeps prose and drops short, numeric, repetitive and overlong sentences."""
+    kept = SentenceQualityFilter().filter(SENTENCES)
+    assert "The drill program tested the northern zone." in kept
+    for dropped in ("59 circ 52 prime 14 prime prime latitude", "Au Au Au Au gold gold", "Short.", "a" * 600,
+                    "1 2 3 4 5 6 7 8"):
+        assert dropped not in kept
+    check(SentenceQualityFilter(), SENTENCES, 'default thresholds')
+
+def test_threshold_boundaries():
+    """Each threshold keeps a sentence exactly at its value and drops it just past it."""
+    sentence = "Gold gold in 12 veins"  # 21 characters, 17 visible: 15 letters, 2 digits; 5 tokens, 1 repeated, 1 numeric
+    boundaries = [('min_length', 21, 22), ('max_length', 21, 20), ('min_alpha_ratio', 15 / 17, 16 / 17),
+                  ('max_digit_ratio', 2 / 17, 1 / 17), ('min_tokens', 5, 6), ('max_repeated_ratio', 1 / 5, 0.19),
+                  ('max_numeric_token_ratio', 1 / 5, 0.19)]
+    loose = {'min_length': 0, 'max_length': 100, 'min_alpha_ratio': 0.0, 'max_digit_ratio': 1.0, 'min_tokens': 0,
+             'max_repeated_ratio': 1.0, 'max_numeric_token_ratio': 1.0}
+    for name, keep_at, drop_at in boundaries:
+        assert SentenceQualityFilter(**{**loose, name: keep_at}).mask([sentence]).tolist() == [True], name
+        assert SentenceQualityFilter(**{**loose, name: drop_at}).mask([sentence]).tolist() == [False], name
+
+def test_random_thresholds():
+    """The vectorized filter matches the reference on random sentences and thresholds."""
+    rng = random.Random(0)
+    alphabet = list("abcdefghijklmnopqrstuvwxyzABCDEFGHIJ0123456789.,;:-/()%°éÉßΩ٣２") + [' '] * 8 + ['\t', '😀', '𝐀']
+    sentences = [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 80))) for _ in range(2000)]
+    words = ['gold', 'Gold', 'GOLD', 'vein', '12', 'g/t', 'the', 'of', '3.5', 'DH-1']
+    sentences += [' '.join(rng.choice(words) for _ in range(rng.randint(1, 12))) for _ in range(2000)]
+    for _ in range(10):
+        quality_filter = SentenceQualityFilter(min_length=rng.randint(0, 20), max_length=rng.randint(20, 80),
+                                               min_alpha_ratio=rng.random(), max_digit_ratio=rng.random(),
+                                               min_tokens=rng.randint(0, 4), max_repeated_ratio=rng.random(),
+                                               max_numeric_token_ratio=rng.random())
+        check(quality_filter, sentences, 'random thresholds')
+
+def test_groups():
+    """mask_groups splits one vectorized pass back into the input lists, including empty ones."""
+    quality_filter = SentenceQualityFilter()
+    groups = [SENTENCES[:3], [], SENTENCES[3:]]
+    assert quality_filter.filter_groups(groups) == [quality_filter.filter(group) for group in groups]
+
+if __name__ == "__main__":
+    test_features_match_reference()
+    test_non_bmp_characters_are_symbols()
+    test_default_thresholds()
+    test_threshold_boundaries()
+    test_random_thresholds()
+    test_groups()
+    print("Sentence quality filter checks passed")
\ No newline at end of file
@@ -0,0 +1,63 @@
+import os
+import tempfile
+from data_prep.parse_and_extract import Document, extract_sentences, refilter_sentences
+from data_prep.quality import SentenceQualityFilter
+
+PAGES = [
+    "# Drill program\n\nThe drill program tested the northern zone. Quartz veins carried visible gold.",
+    "| Hole | Au g/t |\n|---|---|\n| DH-1 | 2.5 |\n\nAssays were done by fire assay at the lab in town.",
+    "Short. Geological mapping covered the claim block and outcrop was scarce in the valley bottom.",
+    "The report repeats a sentence. The report repeats a sentence. 59 52 14 31 12.",
+]
+
+def make_documents():
+    """Return documents of a few varied pages."""
+    return [Document(f"(0,{i + 1})", f"A000001_P{i}", i, page) for i, page in enumerate(PAGES)]
+
+def read_file(path):
+    """Return the contents of a text file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def test_refilter_round_trip():
+    """Refiltering stored segments with the extraction thresholds reproduces the extracted output."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        segment_file = os.path.join(tmp_dir, 'segments.sqlite')
+        extracted = os.path.join(tmp_dir, 'sentences.txt')
+        refiltered = os.path.join(tmp_dir, 'refiltered.txt')
+        quality_filter = SentenceQualityFilter(min_length=12)
+        extract_sentences(make_documents(), extracted, os.path.join(tmp_dir, 'processed_ids.log'),
+                          backend='sentencizer', quality_filter=quality_filter, segment_file=segment_file,
+                          legacy_file=None)
+        refilter_sentences(segment_file, refiltered, os.path.join(tmp_dir, 'refilter_ids.log'),
+                           quality_filter=quality_filter)
+        assert read_file(extracted)
+        assert read_file(refiltered) == read_file(extracted)
+        print(f"Refiltered output matches {len(read_file(extracted).splitlines())} extracted sentences")
+
+        stricter = os.path.join(tmp_dir, 'stricter.txt')
+        refilter_sentences(segment_file, stricter, os.path.join(tmp_dir, 'stricter_ids.log'),
+                           quality_filter=SentenceQualityFilter(min_length=40))
+        kept = read_file(stricter).splitlines()
+        assert kept and all(len(sentence) >= 40 for sentence in kept)
+        assert set(kept) < set(read_file(extracted).splitlines())
+
+def test_refilter_ignores_legacy_checkpoint():
+    """A processed_ids.json in the working directory does not mark documents as refiltered."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            extract_sentences(make_documents(), 'sentences.txt', 'processed_ids.log', backend='sentencizer',
+                              segment_file='segments.sqlite', legacy_file=None)
+            with open('processed_ids.json', 'w', encoding='utf-8') as f:
+                f.write('["A000001_P0", "A000001_P1", "A000001_P2", "A000001_P3"]')
+            refilter_sentences('segments.sqlite', 'refiltered.txt', 'refilter_ids.log')
+            assert read_file('refiltered.txt') == read_file('sentences.txt')
+        finally:
+            os.chdir(cwd)
+
+if __name__ == "__main__":
+    test_refilter_round_trip()
+    test_refilter_ignores_legacy_checkpoint()
+    print("Refilter checks passed")
\ No newline at end of file
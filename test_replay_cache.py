@@ -0,0 +1,55 @@
+import os
+import tempfile
+from data_prep.parse_and_extract import Document
+from data_prep.replay_cache import export_documents, replay_documents, replay_metadata, REPLAY_COMPRESSIONS
+
+def make_documents(count=250):
+    """Return documents with multi-line, non-ASCII and empty markdown."""
+    pages = ["# Title\n\nQuartz veins carry gold.", "| a | b |\n|---|---|\n| 1 | 2 |", "",
+             "Coordinates 59°52′ N, Montréal — naïve façade.\n" * 20]
+    return [Document(f"({i // 10},{i % 10 + 1})", f"A{i // 40:06d}_P{i % 40}", i % 40, pages[i % len(pages)])
+            for i in range(count)]
+
+def test_round_trip():
+    """Documents and metadata replay exactly as exported, for every compression."""
+    documents = make_documents()
+    fetch_options = {'mode': 'sample', 'limit': 250, 'seed': 42, 'shard_index': 0, 'shard_count': 1}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for compression in REPLAY_COMPRESSIONS:
+            replay_file = os.path.join(tmp_dir, f"pages.{compression}.arrow")
+            assert export_documents(iter(documents), replay_file, batch_rows=64, compression=compression,
+                                    metadata=fetch_options) == len(documents)
+            assert not os.path.exists(f"{replay_file}.tmp")
+            assert replay_metadata(replay_file) == fetch_options
+            assert list(replay_documents(replay_file)) == documents
+            print(f"{compression}: {len(documents)} documents, {os.path.getsize(replay_file)} bytes")
+
+def test_sharded_export_is_not_resharded():
+    """A file exported from one shard cannot be replayed as shards again."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        replay_file = os.path.join(tmp_dir, 'pages.arrow')
+        export_documents(make_documents(), replay_file, metadata={'shard_index': 1, 'shard_count': 4})
+        assert len(list(replay_documents(replay_file))) == 250
+        try:
+            list(replay_documents(replay_file, 0, 2))
+        except ValueError as e:
+            print(f"Rejected: {e}")
+            return
+        raise AssertionError("A sharded export was replayed as shards")
+
+def test_unknown_compression():
+    """Unknown compressions are rejected before anything is written."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        replay_file = os.path.join(tmp_dir, 'pages.arrow')
+        try:
+            export_documents(make_documents(), replay_file, compression='brotli')
+        except ValueError:
+            assert not os.path.exists(replay_file)
+            return
+        raise AssertionError("Unknown compression was accepted")
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_sharded_export_is_not_resharded()
+    test_unknown_compression()
+    print("Replay cache checks passed")
\ No newline at end of file
@@ -0,0 +1,58 @@
+import random
+from data_prep.segmentation import load_segmenter, chunk_end, segment_long_text_spans, CHUNK_BREAKS
+from data_prep.segment_store import stripped_spans
+
+def make_text(seed=0, paragraphs=40):
+    """Return a multi-paragraph report; its sentences are at most 162 characters, under half of any chunk size tested."""
+    rng = random.Random(seed)
+    words = ['gold', 'quartz', 'vein', 'drill', 'hole', 'assay', 'claim', 'creek', 'sample', 'the', 'of',
+             'returned', 'Montréal', '2.5', 'g/t', 'DH-12', '59°52′']
+    text = []
+    for _ in range(paragraphs):
+        sentences = []
+        for _ in range(rng.randint(1, 5)):
+            sentence = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 18)))
+            sentences.append(sentence.capitalize() + rng.choice('.?!'))
+        text.append(rng.choice([' ', '\n']).join(sentences))
+    return '\n\n'.join(text)
+
+def test_chunked_matches_whole_text():
+    """A text longer than chunk_size segments into exactly the sentences of the unchunked text."""
+    nlp = load_segmenter('sentencizer')
+    text = make_text()
+    expected = stripped_spans(nlp(text))
+    for chunk_size in (400, 500, 777, 2000):
+        assert len(text) > chunk_size
+        spans = segment_long_text_spans(nlp, text, chunk_size=chunk_size)
+        assert spans == expected, chunk_size
+    print(f"{len(text)} characters, {len(expected)} sentences at every chunk size")
+
+def test_no_sentence_split_at_chunk_edge():
+    """Every chunk edge inside the text falls between two whole sentences."""
+    nlp = load_segmenter('sentencizer')
+    text = make_text(seed=1)
+    chunk_size = 500
+    spans = segment_long_text_spans(nlp, text, chunk_size=chunk_size)
+    whole = {text[start:end] for start, end in stripped_spans(nlp(text))}
+    assert all(text[start:end] in whole for start, end in spans)
+    start = 0
+    while start < len(text):
+        end = chunk_end(text, start, chunk_size)
+        assert end - start <= chunk_size
+        # No sentence may start before an edge and end after it
+        assert not any(s < end < e for s, e in spans), end
+        start = end
+
+def test_text_without_breaks():
+    """A text with none of the chunk breaks still terminates and is covered in chunk_size pieces."""
+    nlp = load_segmenter('sentencizer')
+    text = 'x' * 2300
+    assert not any(separator in text for separator in CHUNK_BREAKS)
+    spans = segment_long_text_spans(nlp, text, chunk_size=500)
+    assert spans == [(0, 500), (500, 1000), (1000, 1500), (1500, 2000), (2000, 2300)]
+
+if __name__ == "__main__":
+    test_chunked_matches_whole_text()
+    test_no_sentence_split_at_chunk_edge()
+    test_text_without_breaks()
+    print("Chunked segmentation checks passed")
\ No newline at end of file
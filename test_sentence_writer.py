@@ -0,0 +1,68 @@
+import os
+import tempfile
+from data_prep.writer import SentenceWriter
+
+def read_lines(path):
+    """Return the lines of a text file, asserting it ends in a newline."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    assert not data or data.endswith(b'\n'), f"{path} ends in a torn line: {data!r}"
+    return data.decode('utf-8').splitlines()
+
+def test_torn_tail_without_journal():
+    """An existing output without a journal is adopted up to its last complete line."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'sentences.txt')
+        with open(output_file, 'wb') as f:
+            f.write(b'old1\nold2\npartial')
+        writer = SentenceWriter(output_file)
+        writer.add('doc-1', ['new'])
+        writer.close()
+        lines = read_lines(output_file)
+        print(f"Recovered without journal: {lines}")
+        assert lines == ['old1', 'old2', 'new']
+
+def test_crc_mismatch_drops_last_batch():
+    """A last batch whose bytes do not match its journaled CRC is truncated on reopen."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'sentences.txt')
+        writer = SentenceWriter(output_file)
+        writer.add('doc-1', ['first sentence'])
+        assert writer.flush() == ['doc-1']
+        writer.add('doc-2', ['second sentence'])
+        assert writer.flush() == ['doc-2']
+        writer.close()
+        # Corrupt one byte of the second batch, as a torn write would
+        with open(output_file, 'r+b') as f:
+            f.seek(len(b'first sentence\n') + 3)
+            f.write(b'X')
+        writer = SentenceWriter(output_file)
+        writer.add('doc-3', ['third sentence'])
+        writer.close()
+        lines = read_lines(output_file)
+        print(f"Recovered after CRC mismatch: {lines}")
+        assert lines == ['first sentence', 'third sentence']
+
+def test_clean_journal_reopen():
+    """A cleanly closed output is reopened unchanged and appended to."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, 'sentences.txt')
+        writer = SentenceWriter(output_file, flush_documents=2)
+        assert writer.add('doc-1', ['a', 'b']) == []
+        assert writer.add('doc-2', []) == ['doc-1', 'doc-2']
+        assert writer.add('doc-3', ['c']) == []
+        assert writer.close() == ['doc-3']
+        size = os.path.getsize(output_file)
+        writer = SentenceWriter(output_file)
+        assert writer.size == size
+        writer.add('doc-4', ['d'])
+        writer.close()
+        lines = read_lines(output_file)
+        print(f"Reopened clean output: {lines}")
+        assert lines == ['a', 'b', 'c', 'd']
+
+if __name__ == "__main__":
+    test_torn_tail_without_journal()
+    test_crc_mismatch_drops_last_batch()
+    test_clean_journal_reopen()
+    print("Sentence writer recovery checks passed")
\ No newline at end of file
@@ -0,0 +1,121 @@
+import os
+import json
+import random
+import tempfile
+import boto3
+from moto import mock_aws
+from data_prep.upload_to_minio import ShardUploader, compute_etag, file_sha256
+
+BUCKET = 'sentences-test'
+
+# moto, like S3, rejects multipart parts below 5 MiB
+PART_SIZE = 5 * 1024 * 1024
+
+def make_client():
+    """Return an S3 client for the moto stand-in with an empty test bucket."""
+    client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='test',
+                          aws_secret_access_key='test')
+    client.create_bucket(Bucket=BUCKET)
+    return client
+
+def write_file(path, size, seed=0):
+    """Write `size` seeded pseudo-random bytes to a file."""
+    with open(path, 'wb') as f:
+        f.write(random.Random(seed).randbytes(size))
+
+def sync_once(client, tmp_dir, paths):
+    """Sync files through a ShardUploader and return its decisions by file name."""
+    uploader = ShardUploader(BUCKET, prefix='sentences', workers=2, part_size=PART_SIZE, max_concurrency=4,
+                             s3_client=client, sync=True, sync_log=os.path.join(tmp_dir, 'sync_log.jsonl'))
+    for path in paths:
+        uploader.submit(path)
+    uploader.wait()
+    return {os.path.basename(decision['path']): (decision['action'], decision['reason'])
+            for decision in uploader.decisions}
+
+def test_multipart_upload():
+    """Files above part_size are uploaded as concurrent multipart uploads with the expected ETag."""
+    with mock_aws(), tempfile.TemporaryDirectory() as tmp_dir:
+        client = make_client()
+        path = os.path.join(tmp_dir, 'sentences-00000.txt.gz')
+        write_file(path, 2 * PART_SIZE + 12345)
+        with ShardUploader(BUCKET, prefix='sentences', workers=2, part_size=PART_SIZE, max_concurrency=4,
+                           s3_client=client) as uploader:
+            assert uploader.transfer_config.multipart_threshold == PART_SIZE
+            assert uploader.transfer_config.max_concurrency == 4
+            uploader.submit(path)
+        head = client.head_object(Bucket=BUCKET, Key='sentences/sentences-00000.txt.gz')
+        etag = head['ETag'].strip('"')
+        print(f"Multipart upload ETag: {etag}")
+        assert etag.endswith('-3'), f"Expected a 3-part upload, got ETag {etag}"
+        assert etag == compute_etag(path, PART_SIZE)
+        body = client.get_object(Bucket=BUCKET, Key='sentences/sentences-00000.txt.gz')['Body'].read()
+        with open(path, 'rb') as f:
+            assert body == f.read()
+
+def test_sync_sha256_metadata():
+    """Synced objects carry their SHA-256, which decides whether a later sync skips or uploads."""
+    with mock_aws(), tempfile.TemporaryDirectory() as tmp_dir:
+        client = make_client()
+        small = os.path.join(tmp_dir, 'manifest.json')
+        large = os.path.join(tmp_dir, 'sentences-00000.txt.gz')
+        write_file(small, 1000)
+        write_file(large, PART_SIZE + 1)
+
+        assert sync_once(client, tmp_dir, [small, large]) == {
+            'manifest.json': ('upload', 'missing in bucket'),
+            'sentences-00000.txt.gz': ('upload', 'missing in bucket')
+        }
+        head = client.head_object(Bucket=BUCKET, Key='sentences/sentences-00000.txt.gz')
+        assert head['Metadata']['sha256'] == file_sha256(large)
+
+        assert sync_once(client, tmp_dir, [small, large]) == {
+            'manifest.json': ('skip', 'sha256 matches'),
+            'sentences-00000.txt.gz': ('skip', 'sha256 matches')
+        }
+
+        write_file(small, 1000, seed=1)
+        assert sync_once(client, tmp_dir, [small, large]) == {
+            'manifest.json': ('upload', 'sha256 differs'),
+            'sentences-00000.txt.gz': ('skip', 'sha256 matches')
+        }
+        with open(os.path.join(tmp_dir, 'sync_log.jsonl'), 'r', encoding='utf-8') as f:
+            assert len([json.loads(line) for line in f]) == 6
+        print("SHA-256 metadata sync decisions as expected")
+
+def test_sync_etag():
+    """Objects uploaded without SHA-256 metadata are compared by ETag, single-part and multipart."""
+    with mock_aws(), tempfile.TemporaryDirectory() as tmp_dir:
+        client = make_client()
+        small = os.path.join(tmp_dir, 'manifest.json')
+        large = os.path.join(tmp_dir, 'sentences-00000.txt.gz')
+        write_file(small, 1000)
+        write_file(large, 2 * PART_SIZE + 1)
+        uploader = ShardUploader(BUCKET, prefix='sentences', part_size=PART_SIZE, s3_client=client)
+        # Uploaded by another tool, without the sha256 metadata
+        for path in (small, large):
+            client.upload_file(path, BUCKET, uploader.object_name(path), Config=uploader.transfer_config)
+        uploader.wait()
+
+        assert sync_once(client, tmp_dir, [small, large]) == {
+            'manifest.json': ('skip', 'etag matches'),
+            'sentences-00000.txt.gz': ('skip', 'etag matches')
+        }
+
+        write_file(small, 1000, seed=1)
+        write_file(large, 2 * PART_SIZE + 1, seed=1)
+        for path in (small, large):
+            client.upload_file(path, BUCKET, uploader.object_name(path), Config=uploader.transfer_config)
+        write_file(small, 1000, seed=2)
+        write_file(large, 2 * PART_SIZE + 1, seed=2)
+        assert sync_once(client, tmp_dir, [small, large]) == {
+            'manifest.json': ('upload', 'etag differs'),
+            'sentences-00000.txt.gz': ('upload', 'etag differs')
+        }
+        print("ETag sync decisions as expected")
+
+if __name__ == "__main__":
+    test_multipart_upload()
+    test_sync_sha256_metadata()
+    test_sync_etag()
+    print("Shard uploader checks passed")
\ No newline at end of file